@@ -1,11 +1,15 @@
 import streamlit as st
 from dispatcher import Dispatcher
-from llm_main import LLMRouter
+from llm_main import LLMRouter, MODEL_CONFIG
 from main import Classifier
 import re
 import os 
 from main import Classifier, choose_function, rule_based_func
 from data.parser_test import FunctionClash
+from helpers.artifacts import get_artifact_store, find_artifacts, strip_artifacts
+from helpers.jobs import get_job_queue, find_jobs, strip_jobs
+from dispatcher import JOB_FUNCTIONS
+from helpers.backends import readings_version
 
 @st.cache_resource
 def load_classifier():
@@ -31,7 +35,7 @@ def render_assistant_message(msg, func_name=None):
     """
     think_pattern = re.compile(r"<think>(.*?)</think>", re.DOTALL)
     thinks = think_pattern.findall(msg)
-    main = think_pattern.sub("", msg).strip()
+    main = strip_jobs(strip_artifacts(think_pattern.sub("", msg)))
 
     # Show each <think> block first (if any)
     for i, think_content in enumerate(thinks, 1):
@@ -45,23 +49,55 @@ def render_assistant_message(msg, func_name=None):
     # Then show the main answer if any
     if main:
         st.markdown(main, unsafe_allow_html=True)
-    if "==PDF ALERT==" in msg:
-        if func_name == "reporter_Asaoka" and os.path.exists("static/asaoka_report.pdf"):
-            with open("static/asaoka_report.pdf", "rb") as f:
-                st.download_button(
-                    label="Download Asaoka Report PDF",
-                    data=f.read(),
-                    file_name="asaoka_report.pdf",
-                    mime="application/pdf"
-                )
-        elif func_name == "plot_combi_S" and os.path.exists("static/Combined_settlement_plot.pdf"):
-            with open("static/Combined_settlement_plot.pdf", "rb") as f:
-                st.download_button(
-                    label="Download Combined Settlement Plot PDF", 
-                    data=f.read(),
-                    file_name="Combined_settlement_plot.pdf",
-                    mime="application/pdf"
-                )
+    render_downloads(msg)
+    for job_id in find_jobs(msg):
+        render_job(job_id)
+
+
+DOWNLOAD_LABELS = {
+    "asaoka_report.pdf": "Download Asaoka Report PDF",
+    "Combined_settlement_plot.pdf": "Download Combined Settlement Plot PDF",
+}
+
+def render_downloads(msg):
+    """Download button for each [artifact:<id>] token in the message that still has a file behind it."""
+    for artifact_id in find_artifacts(msg):
+        path = get_artifact_store().path(artifact_id)
+        if path is None:
+            st.caption("This report has expired; ask for it again to regenerate it.")
+            continue
+        file_name = os.path.basename(path)
+        with open(path, "rb") as f:
+            st.download_button(
+                label=DOWNLOAD_LABELS.get(file_name, f"Download {file_name}"),
+                data=f.read(),
+                file_name=file_name,
+                mime="application/pdf",
+                key=f"download-{artifact_id}"
+            )
+
+
+def render_job(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        st.caption("This report job is no longer available; ask for it again to regenerate it.")
+    elif not job.finished:
+        job_progress(job_id)
+    elif job.status == "failed":
+        st.error(f"Report generation failed: {job.error}")
+    elif find_artifacts(job.result):
+        render_downloads(job.result)
+    else:
+        st.warning("No report could be generated for these plates.")
+
+@st.fragment(run_every=1.0)
+def job_progress(job_id):
+    """Polls a running job once a second; a full rerun swaps in the download when it finishes."""
+    job = get_job_queue().get(job_id)
+    if job is None or job.finished:
+        st.rerun()
+    text = job.message or ("Waiting for a free report worker..." if job.status == "queued" else "Starting...")
+    st.progress(job.fraction, text=f"{text} ({job.done}/{job.total})" if job.total else text)
 
 
 # --- Streamlit Chat UI for NL2Func Pipeline ---
@@ -95,13 +131,25 @@ if "deep_mode" not in st.session_state:
 st.session_state.recap_mode = st.sidebar.toggle("Recap Mode (@recap)", value=st.session_state.recap_mode)
 st.sidebar.caption("Include a summary of previous conversation in the prompt.")
 
+def prewarm(mode):
+    # start loading the model as soon as the mode is picked, before the user submits
+    if "llm_router" in st.session_state:
+        st.session_state.llm_router.residency.warm(MODEL_CONFIG[mode])
+
 def set_think():
+    # callbacks run before the toggle returns its new value, so think_mode is still the old one
+    switched_on = not st.session_state.think_mode
     st.session_state.think_mode = True
     st.session_state.deep_mode = False
+    if switched_on:
+        prewarm("think")
 
 def set_deep():
+    switched_on = not st.session_state.deep_mode
     st.session_state.deep_mode = True
     st.session_state.think_mode = False
+    if switched_on:
+        prewarm("deep")
 
 st.session_state.think_mode = st.sidebar.toggle("Think Mode (@think)", value=st.session_state.think_mode, on_change=set_think)
 st.sidebar.caption("Use the 'think' model for more reasoning.")
@@ -136,7 +184,7 @@ def add_message(role, message):
 def display_chat():
     for role, msg in st.session_state.chat_history:
         with st.chat_message(role):
-            if role == "assistant" and isinstance(msg, str) and "<think>" in msg:
+            if role == "assistant" and isinstance(msg, str) and ("<think>" in msg or find_artifacts(msg) or find_jobs(msg)):
                 render_assistant_message(msg)
             elif isinstance(msg, str):
                 st.markdown(msg)
@@ -144,6 +192,32 @@ def display_chat():
                 for chunk in msg:
                     st.markdown(chunk, unsafe_allow_html=True)
 
+# --- Background report jobs ---
+def start_report_job(user_input, func_name, params):
+    """Queue a PDF function and post a chat message that tracks its progress and offers the download."""
+    add_message("user", user_input)
+    with st.chat_message("user"):
+        st.markdown(user_input)
+    job_id = st.session_state.dispatcher.submit_function(func_name, params)
+    ack = f"Generating the {get_function_description(func_name).lower()} in the background."
+    msg = f"{ack} [job:{job_id}]"
+    # reports skip the LLM, but the turn still goes into the router's memory for @recap
+    st.session_state.llm_router.record_turn(user_input, ack)
+    add_message("assistant", msg)
+    with st.chat_message("assistant"):
+        render_assistant_message(msg)
+
+def data_version(params):
+    """Readings version of the plates a function ran on, so cached answers retire when new readings arrive."""
+    ids = (params or {}).get("ids", (params or {}).get("id"))
+    if not ids:
+        return None
+    try:
+        return readings_version([ids] if isinstance(ids, str) else ids)
+    except Exception as e:
+        print(f"[Warning] Could not read the readings version: {e}")
+        return None
+
 # --- LLM Streaming Response ---
 def stream_response(user_input, func_name=None, params=None, func_output=None):
     # echo user
@@ -153,6 +227,7 @@ def stream_response(user_input, func_name=None, params=None, func_output=None):
 
     placeholder = st.empty()
     full_response = ""
+    stream = None
     with st.chat_message("assistant"), st.spinner("Assistant is typing..."):
         try:
             stream = st.session_state.llm_router.handle_user(
@@ -161,6 +236,7 @@ def stream_response(user_input, func_name=None, params=None, func_output=None):
                 classifier_data=(None if not func_name else {"Function": func_name, "Params": params, "Output": func_output}),
                 func_output=func_output,
                 stream=True,
+                data_version=data_version(params) if func_name else None,
             )
             for token in stream:
                 full_response += token
@@ -179,6 +255,10 @@ def stream_response(user_input, func_name=None, params=None, func_output=None):
         except Exception as e:
             placeholder.markdown(f"**[Error: {e}]**")
             full_response = f"[Error: {e}]"
+        finally:
+            # the run is stopped mid-stream when the user navigates away; cancel the generation
+            if stream is not None and hasattr(stream, "close"):
+                stream.close()
 
     add_message("assistant", full_response)
 
@@ -215,21 +295,15 @@ if given_input:
                 slot_info["slots_needed"].pop(0)
             try:
                 description = get_function_description(slot_info["func_name"])
-                with st.spinner(f"Running {description}..."):
-                    params = disp.pure_parse(slot_info["aux_ctx"], slot_info["func_name"])
-                    out = disp.run_function(slot_info["func_name"], params)
+                params = disp.pure_parse(slot_info["aux_ctx"], slot_info["func_name"])
                 st.session_state.slot_state = None
-                
-                # Add this check to skip LLM for PDF functions in slot-filling path
-                if slot_info["func_name"] in ["reporter_Asaoka", "plot_combi_S"]:
-                    add_message("user", slot_info["orig_query"])
-                    with st.chat_message("user"):
-                        st.markdown(slot_info["orig_query"])
-                    with st.chat_message("assistant"), st.spinner("Generating PDF..."):
-                        pdf_msg = "==PDF ALERT==\nA PDF has been generated and is ready for download below."
-                        add_message("assistant", pdf_msg)
-                        render_assistant_message(pdf_msg, func_name=slot_info["func_name"])
+
+                # PDF functions skip the LLM and render on the background job queue
+                if slot_info["func_name"] in JOB_FUNCTIONS:
+                    start_report_job(slot_info["orig_query"], slot_info["func_name"], params)
                 else:
+                    with st.spinner(f"Running {description}..."):
+                        out = disp.run_function(slot_info["func_name"], params)
                     stream_response(slot_info["orig_query"], slot_info["func_name"], params, out)
             except Exception as e:
                 print(f"[DEBUG] Exception in slot-filling: {e}")
@@ -279,10 +353,13 @@ if given_input:
             # Execute the function
             try:
                 description = get_function_description(chosen_func)
-                with st.spinner(f"Running {description}..."):
-                    params = disp.pure_parse(clash_info["tagged_input"], chosen_func)
-                    out = disp.run_function(chosen_func, params)
-                stream_response(clash_info["original_input"], chosen_func, params, out)
+                params = disp.pure_parse(clash_info["tagged_input"], chosen_func)
+                if chosen_func in JOB_FUNCTIONS:
+                    start_report_job(clash_info["original_input"], chosen_func, params)
+                else:
+                    with st.spinner(f"Running {description}..."):
+                        out = disp.run_function(chosen_func, params)
+                    stream_response(clash_info["original_input"], chosen_func, params, out)
             except Exception as e:
                 if hasattr(e, "slot"):
                     st.session_state.slot_state = {
@@ -307,10 +384,13 @@ if given_input:
             # Execute the function
             try:
                 description = get_function_description(chosen_func)
-                with st.spinner(f"Running {description}..."):
-                    params = disp.pure_parse(clash_info["tagged_input"], chosen_func)
-                    out = disp.run_function(chosen_func, params)
-                stream_response(clash_info["original_input"], chosen_func, params, out)
+                params = disp.pure_parse(clash_info["tagged_input"], chosen_func)
+                if chosen_func in JOB_FUNCTIONS:
+                    start_report_job(clash_info["original_input"], chosen_func, params)
+                else:
+                    with st.spinner(f"Running {description}..."):
+                        out = disp.run_function(chosen_func, params)
+                    stream_response(clash_info["original_input"], chosen_func, params, out)
             except Exception as e:
                 if hasattr(e, "slot"):
                     st.session_state.slot_state = {
@@ -362,11 +442,14 @@ if given_input:
             if func_name:
                 try:
                     description = get_function_description(func_name)
-                    with st.spinner(f"Running {description}..."):
-                        params = disp.pure_parse(input_text, func_name)
-                        out = disp.run_function(func_name, params)
-                    print("[DEBUG] OUTPUT after running: ", out)
-                    stream_response(input_text, func_name, params, out)
+                    params = disp.pure_parse(input_text, func_name)
+                    if func_name in JOB_FUNCTIONS:
+                        start_report_job(input_text, func_name, params)
+                    else:
+                        with st.spinner(f"Running {description}..."):
+                            out = disp.run_function(func_name, params)
+                        print("[DEBUG] OUTPUT after running: ", out)
+                        stream_response(input_text, func_name, params, out)
                 except Exception as e:
                     if hasattr(e, "slot"):
                         st.session_state.slot_state = {
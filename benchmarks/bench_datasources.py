@@ -0,0 +1,49 @@
+"""
+Offline timing of the data functions against a synthetic site.
+
+    python -m benchmarks.bench_datasources --plates 200
+"""
+import argparse
+import os
+import time
+
+from helpers.backends import set_datasource
+from helpers.synthetic import generate_site, plate_id
+
+
+def timed(label, fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    print(f"{label:<40} {time.perf_counter() - t0:8.3f} s")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--plates", type=int, default=200)
+    parser.add_argument("--report-plates", type=int, default=5)
+    parser.add_argument("--db", default=os.path.join("static", "cache", "bench.sqlite"))
+    parser.add_argument("--reuse", action="store_true", help="reuse an existing --db instead of regenerating")
+    args = parser.parse_args()
+
+    if not (args.reuse and os.path.exists(args.db)):
+        ids = timed(f"generate_site ({args.plates} plates)", generate_site, args.db, args.plates)
+    else:
+        ids = [plate_id(i) for i in range(args.plates)]
+    datasource = set_datasource(f"sqlite:{args.db}")
+    datasource.cache.clear()
+
+    from helpers.asaoka import Asaoka_data
+    from helpers.datasources import S_series, SM_overview
+    from helpers.reporter import reporter_Asaoka
+
+    timed("S_series (cold cache)", S_series, ids)
+    timed("S_series (warm cache)", S_series, ids)
+    timed(f"Asaoka_data x{len(ids)}", lambda: [Asaoka_data(id, None, None) for id in ids])
+    timed(f"SM_overview ({len(ids)} plates)", SM_overview, ids)
+
+    report_ids = ids[:args.report_plates]
+    plates = [datasource.plate_info(id).iloc[0] for id in report_ids]
+    SCD = min(p["Surcharge_complete_date"] for p in plates)
+    ASD = max(p["Asaoka_Start_Date"] for p in plates)
+    timed(f"reporter_Asaoka ({len(report_ids)} plates)", reporter_Asaoka, report_ids, SCD, ASD, None)
@@ -0,0 +1,103 @@
+"""
+End-to-end latency of LLMRouter.handle_user against the mock Ollama server.
+
+    python -m benchmarks.bench_router --sessions 1,4,8 --ttft 0.3 --tps 40
+    python -m benchmarks.bench_router --url http://localhost:11434   # a real (or separately started) server
+
+Each session is its own router, like one Streamlit session, and consumes the stream the way
+app.stream_response does (accumulate and re-render the preview per token). TTFT and total time are
+measured at the consumer, so "ttft overhead" is what routing, prompt building and the client add
+on top of the server's own time to first token. Memory summarization (no T5 needed) and the
+response cache are off.
+"""
+import argparse
+import contextlib
+import io
+import random
+import statistics
+import threading
+import time
+
+from benchmarks.bench_ttft import overview_rows
+from benchmarks.mock_ollama import start_mock
+from helpers.serializers import serialize_results
+from llm_client import LLMClient, LLM_MODEL_CONCURRENCY, set_llm_client
+from llm_main import LLMRouter
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def consume(stream):
+    """Same per-token work as app.stream_response; returns (ttft, total, tokens, response)."""
+    t0 = time.perf_counter()
+    ttft, tokens, full_response = None, 0, ""
+    for token in stream:
+        if ttft is None:
+            ttft = time.perf_counter() - t0
+        tokens += 1
+        full_response += token
+        full_response.replace("<think>", "\n---\n💡 **Thought process:**\n").replace("</think>", "\n---\n")
+    return ttft, time.perf_counter() - t0, tokens, full_response
+
+
+def session(router, turns, with_data, results, seed):
+    rng = random.Random(seed)
+    for i in range(turns):
+        if with_data:
+            output = f"===USER DATA===\n{serialize_results('SM_overview', overview_rows(rng, 20))}"
+            stream = router.handle_user(f"give me an overview of these plates (turn {i})", func_name="SM_overview",
+                                        classifier_data={"Function": "SM_overview", "Params": {}},
+                                        func_output=output, stream=True)
+        else:
+            stream = router.handle_user(f"@recap what did we discuss so far? (turn {i})", stream=True)
+        results.append(consume(stream))
+
+
+def run(concurrency, turns, with_data):
+    routers = [LLMRouter(background_summaries=False, summarize_memory=False, response_cache=False) for _ in range(concurrency)]
+    results = []
+    threads = [threading.Thread(target=session, args=(router, turns, with_data, results, i))
+               for i, router in enumerate(routers)]
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # handle_user logs every prompt
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return results, time.perf_counter() - t0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=None, help="server to use instead of starting the mock")
+    parser.add_argument("--sessions", default="1,2,4,8", help="comma separated concurrency levels")
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--ttft", type=float, default=0.3)
+    parser.add_argument("--tps", type=float, default=40.0)
+    parser.add_argument("--parallel", type=int, default=4, help="mock: requests per model generating at once")
+    parser.add_argument("--client-concurrency", type=int, default=None,
+                        help="LLM client generations per model at once (default NL2FUNC_LLM_MODEL_CONCURRENCY)")
+    parser.add_argument("--no-data", action="store_true", help="plain chat turns instead of overview turns")
+    args = parser.parse_args()
+
+    if args.url is None:
+        server = start_mock(ttft=args.ttft, tps=args.tps, parallel=args.parallel)
+        print(f"mock server {server.url}: ttft {args.ttft}s, {args.tps} tokens/s, {args.parallel} parallel per model")
+    client = LLMClient(args.url or server.url, model_concurrency=args.client_concurrency or LLM_MODEL_CONCURRENCY)
+    set_llm_client(client)
+    print(f"client: {client.model_concurrency} generations per model, pool of {client.pool_size}")
+    run(1, 1, False)  # warm up imports, the client loop and the connection pool
+
+    print(f"{'sessions':>8} {'requests':>9} {'ttft p50':>9} {'ttft p95':>9} {'overhead':>9} "
+          f"{'total p50':>10} {'tokens/s':>9} {'req/s':>7}")
+    for concurrency in [int(c) for c in args.sessions.split(",")]:
+        results, wall = run(concurrency, args.turns, not args.no_data)
+        ttfts = [r[0] for r in results if r[0] is not None]
+        totals = [r[1] for r in results]
+        tokens = sum(r[2] for r in results)
+        overhead = statistics.median(ttfts) - args.ttft if args.url is None else float("nan")
+        print(f"{concurrency:8d} {len(results):9d} {percentile(ttfts, 0.5):9.3f} {percentile(ttfts, 0.95):9.3f} "
+              f"{overhead:9.3f} {percentile(totals, 0.5):10.3f} {tokens / wall:9.1f} {len(results) / wall:7.2f}")
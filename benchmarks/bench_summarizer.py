@@ -0,0 +1,64 @@
+"""
+Latency and summary length of the memory summarizer modes.
+
+    python -m benchmarks.bench_summarizer --pairs 3
+
+"baseline" is the old path: quality mode, one generate call per text. The other rows batch
+all pairs into one generate call per mode, with and without int8 dynamic quantization.
+"""
+import argparse
+import time
+
+from summarizer import SummarizerService
+
+USER_TEXTS = [
+    "Give me the Asaoka assessment for F3-R03a-SM-01 with surcharge completed on 2025-03-29 and assessment from 2025-04-05.",
+    "Show me an overview of all settlement plates in region R12 and tell me which ones are not compliant yet.",
+    "What was the 7 day settlement rate for F3-R22c-SM-07 last week and is it below the 4 mm criterion?",
+]
+ASSISTANT_TEXTS = [
+    "F3-R03a-SM-01 has an Asaoka DOC of 93.4% with a predicted final settlement of 1.842 m. The latest reading on "
+    "2025-07-11 is -1.721 m at a ground level of 17.12 mCD, so the plate meets the DOC > 90% and ground level "
+    "criteria. Settlement is tapering: the fitted line y = 0.912x + 162.3 gives an R2 of 0.99.",
+    "Of the 26 plates in R12, 21 meet all three criteria. F3-R12b-SM-04, F3-R12b-SM-09 and F3-R12c-SM-15 are below "
+    "90% DOC with holding periods under 120 days, and F3-R12d-SM-02 and F3-R12d-SM-11 still settle more than 4 mm "
+    "per week. Longer holding periods line up with lower 7 day rates across the region.",
+    "F3-R22c-SM-07 settled 3.2 mm over the last 7 days (2025-07-04 to 2025-07-11), which is within the 4 mm "
+    "criterion. The rate has dropped from 6.8 mm the week before, consistent with a holding period of 187 days.",
+]
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - t0, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pairs", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pairs = [(USER_TEXTS[i % len(USER_TEXTS)], ASSISTANT_TEXTS[i % len(ASSISTANT_TEXTS)]) for i in range(args.pairs)]
+    texts = [t for pair in pairs for t in (f"User: {pair[0]}", f"Assistant: {pair[1]}")]
+    input_chars = sum(len(t) for t in texts)
+
+    rows = [("baseline", SummarizerService("quality", False), False)]
+    for mode in ("quality", "fast", "greedy"):
+        for quantize in (False, True):
+            rows.append((f"{mode}{' int8' if quantize else ''}", SummarizerService(mode, quantize), True))
+
+    print(f"{args.pairs} pairs, {input_chars} input chars, best of {args.repeat}")
+    print(f"{'mode':<16} {'load s':>8} {'latency s':>10} {'per pair s':>11} {'summary chars':>14}")
+    for label, service, batched in rows:
+        load, _ = timed(service.load)
+        best, summaries = None, None
+        for _ in range(args.repeat):
+            if batched:
+                elapsed, summaries = timed(service.summarize_batch, texts)
+            else:
+                elapsed, summaries = timed(lambda: [service.summarize(t) for t in texts])
+            best = elapsed if best is None else min(best, elapsed)
+        chars = sum(len(s) for s in summaries)
+        print(f"{label:<16} {load:8.2f} {best:10.3f} {best / args.pairs:11.3f} {chars:14d}")
@@ -0,0 +1,79 @@
+"""
+Time to first token for the old single-system-message prompt layout and the current one, where
+the static system instructions are a separate, byte-identical first message.
+
+    NL2FUNC_OLLAMA_URL=http://localhost:11434 python -m benchmarks.bench_ttft --turns 6
+    python -m benchmarks.bench_ttft --mock --prefill-tps 400   # mock server that models the prompt cache
+
+Each layout runs the same sequence of overview turns (different plates and history each turn)
+after one warm-up request, so later turns can only be faster if Ollama reuses the cached prefix.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from benchmarks.mock_ollama import start_mock
+from helpers.serializers import serialize_results
+from llm_client import LLMClient, set_llm_client
+from helpers.synthetic import plate_id
+from llm_main import LLMRouter, FUNCTION_GUIDELINES, MODEL_CONFIG, build_messages, ollama_stream
+
+
+def overview_rows(rng, plates):
+    start = rng.randrange(0, 1900 - plates)
+    return [{"PointID": plate_id(i), "latest_Settlement": -rng.uniform(0.5, 2.5), "Latest_GL": rng.uniform(15.5, 19.5),
+             "Latest_Date": "2025-07-11", "Asaoka_DOC": rng.uniform(80, 100), "Holding_period": rng.randrange(60, 450),
+             "7day_rate": rng.uniform(0, 8)} for i in range(start, start + plates)]
+
+
+def fused_layout(messages):
+    """The layout before the static prefix split: every system part in one message."""
+    system = '\n\n'.join(m["content"] for m in messages if m["role"] == "system")
+    return [{"role": "system", "content": system}] + [m for m in messages if m["role"] != "system"]
+
+
+def first_token(messages, model):
+    t0 = time.perf_counter()
+    ttft = None
+    for _ in ollama_stream(messages, model):
+        if ttft is None:
+            ttft = time.perf_counter() - t0
+    return ttft, time.perf_counter() - t0
+
+
+def turns(system, count, plates, seed=0):
+    rng = random.Random(seed)
+    history = []
+    for i in range(count):
+        data = serialize_results("SM_overview", overview_rows(rng, plates))
+        query = f"@recap give me an overview of these {plates} plates and flag the non-compliant ones (turn {i})"
+        yield build_messages(system, history, query, classifier_data={"Function": "SM_overview", "Params": {}},
+                             func_guidelines=FUNCTION_GUIDELINES["SM_overview"],
+                             func_output=f"===USER DATA===\n{data}")
+        history = [(f"overview turn {i}", "Most plates are compliant; a few are below 90% DOC.")] + history[:2]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=MODEL_CONFIG["text"])
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--plates", type=int, default=20)
+    parser.add_argument("--mock", action="store_true", help="run against the mock server instead of NL2FUNC_OLLAMA_URL")
+    parser.add_argument("--prefill-tps", type=float, default=400.0, help="mock: prompt tokens per second outside the cache")
+    args = parser.parse_args()
+
+    if args.mock:
+        server = start_mock(ttft=0.05, tps=200, prefill_tps=args.prefill_tps, num_ctx=8192)
+        set_llm_client(LLMClient(server.url))
+
+    system = LLMRouter(summarize_memory=False, warm_models=False, response_cache=False).system_messages
+    print(f"{args.model}: {args.turns} turns of {args.plates} plates each")
+    print(f"{'layout':<10} {'warm-up ttft s':>15} {'median ttft s':>14} {'min ttft s':>11} {'median total s':>15}")
+    for layout, arrange in (("fused", fused_layout), ("prefix", lambda messages: messages)):
+        runs = [arrange(messages) for messages in turns(system, args.turns + 1, args.plates)]
+        warmup, _ = first_token(runs[0], args.model)
+        timings = [first_token(messages, args.model) for messages in runs[1:]]
+        ttfts = [t for t, _ in timings]
+        print(f"{layout:<10} {warmup:15.3f} {statistics.median(ttfts):14.3f} {min(ttfts):11.3f} "
+              f"{statistics.median(total for _, total in timings):15.3f}")
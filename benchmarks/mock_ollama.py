@@ -0,0 +1,248 @@
+"""
+Stand-in for a local Ollama server, for latency and concurrency tests without real models.
+
+    python -m benchmarks.mock_ollama --port 11435 --ttft 0.3 --tps 40
+    NL2FUNC_OLLAMA_URL=http://localhost:11435 streamlit run app.py
+
+Implements streamed chat on /api/chat (newline-delimited JSON, what llm_client uses) and
+/v1/chat/completions (OpenAI SSE), both chunked over kept-alive connections, plus /api/tags,
+/api/ps and /api/generate (empty prompt loads a model, keep_alive 0 unloads it) so warm-up code
+can be exercised. Any model name is accepted. The first request for a model that is not loaded
+pays --load-time on top of --ttft, and at most --parallel requests per model generate at once,
+the rest queue as they would in Ollama. Replies echo the user query unless --reply is given.
+
+With --prefill-tps the mock also models Ollama's prompt cache: each model remembers its last
+prompt, and only the part after the prefix shared with it is "evaluated", at that many prompt
+tokens per second, on top of --ttft. Prompts longer than the context (options.num_ctx, default
+--num-ctx) are counted as truncated, as Ollama would silently cut them from the front.
+"""
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from llm_client import parse_keep_alive
+
+DEFAULT_REPLY = ("All plates in the query meet the DOC above 90% and ground level criteria; "
+                 "settlement rates are below 4 mm per 7 days and tapering with longer holding periods.")
+
+
+class MockOllama(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, ttft=0.3, tps=40.0, load_time=0.0, parallel=4, reply=None, think=False,
+                 prefill_tps=0.0, num_ctx=2048):
+        super().__init__(address, MockHandler)
+        self.prefill_tps = prefill_tps
+        self.num_ctx = num_ctx
+        self.prompts = {}      # model -> last prompt, the cached prefix
+        self.truncated = 0
+        self.ttft = ttft
+        self.tps = tps
+        self.load_time = load_time
+        self.parallel = parallel
+        self.reply = reply
+        self.think = think
+        self.loaded = {}       # model -> expiry time (inf = forever)
+        self.slots = {}        # model -> threading.Semaphore
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return  # client closed a kept-alive connection
+        super().handle_error(request, client_address)
+
+    def slot(self, model):
+        with self.lock:
+            if model not in self.slots:
+                self.slots[model] = threading.BoundedSemaphore(self.parallel)
+            return self.slots[model]
+
+    def load(self, model, keep_alive=None):
+        """Mark the model resident for keep_alive; returns the seconds spent loading it (0 if it already was)."""
+        now = time.time()
+        with self.lock:
+            resident = self.loaded.get(model, 0) > now
+        delay = 0.0 if resident else self.load_time
+        if delay:
+            time.sleep(delay)
+        seconds = parse_keep_alive(keep_alive)
+        with self.lock:
+            if not resident:
+                self.prompts.pop(model, None)  # a reloaded model starts with an empty cache
+            if seconds == 0:
+                self.loaded.pop(model, None)
+            else:
+                self.loaded[model] = float("inf") if seconds < 0 else time.time() + seconds
+        return delay
+
+    def running(self):
+        now = time.time()
+        with self.lock:
+            return [m for m, expires in self.loaded.items() if expires > now]
+
+    def prefill(self, model, messages, options):
+        """Prompt tokens evaluated for this request (the part not in the cached prefix) and the seconds it takes."""
+        prompt = "".join(f"<{m.get('role')}>{m.get('content', '')}" for m in messages)
+        with self.lock:
+            cached = len(os.path.commonprefix([self.prompts.get(model, ""), prompt]))
+            self.prompts[model] = prompt
+            if math.ceil(len(prompt) / 4) > (options or {}).get("num_ctx", self.num_ctx):
+                self.truncated += 1
+        evaluated = math.ceil((len(prompt) - cached) / 4)
+        return evaluated, evaluated / self.prefill_tps if self.prefill_tps else 0.0
+
+    def reply_tokens(self, model, messages):
+        text = self.reply
+        if text is None:
+            query = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+            query = query.replace("=== USER QUERY ===", "").strip()
+            text = f"You asked: {query}. {DEFAULT_REPLY}" if query else DEFAULT_REPLY
+        if self.think and model.startswith("deepseek-r1"):
+            text = "<think>\nChecking the plates against the compliance criteria.\n</think>\n" + text
+        return re.findall(r"\S+\s*", text)
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def send_json(self, body, status=200):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            with self.server.lock:
+                known = sorted(set(self.server.slots) | set(self.server.loaded))
+            self.send_json({"models": [{"name": m, "model": m} for m in known]})
+        elif self.path == "/api/ps":
+            with self.server.lock:
+                expires = {m: self.server.loaded[m] for m in self.server.loaded}
+            self.send_json({"models": [{"name": m, "model": m, "expires_at": expires_at(expires.get(m))}
+                                       for m in self.server.running()]})
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        self.server.requests += 1
+        if self.path == "/api/generate":
+            body = self.read_json()
+            delay = self.server.load(body.get("model", ""), body.get("keep_alive"))
+            self.send_json({"model": body.get("model"), "response": "", "done": True,
+                            "load_duration": int(delay * 1e9)})
+        elif self.path == "/api/chat":
+            self.chat(self.read_json(), ndjson=True)
+        elif self.path == "/v1/chat/completions":
+            self.chat(self.read_json(), ndjson=False)
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def chat(self, body, ndjson):
+        model = body.get("model")
+        if not model or not isinstance(body.get("messages"), list):
+            self.send_json({"error": "model and messages are required"}, 400)
+            return
+        if body.get("stream") is False:
+            self.send_json({"error": "the mock only streams"}, 400)
+            return
+        server = self.server
+        with server.slot(model):
+            server.load(model, body.get("keep_alive"))
+            evaluated, prefill = server.prefill(model, body["messages"], body.get("options"))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson" if ndjson else "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            id, created = f"chatcmpl-{uuid.uuid4().hex[:12]}", int(time.time())
+
+            def event(content, done=False):
+                if ndjson:
+                    chunk = {"model": model, "message": {"role": "assistant", "content": content}, "done": done}
+                    if done:
+                        chunk.update(done_reason="stop", prompt_eval_count=evaluated,
+                                     prompt_eval_duration=int(prefill * 1e9))
+                    self.write_chunk((json.dumps(chunk) + "\n").encode())
+                else:
+                    chunk = {"id": id, "object": "chat.completion.chunk", "created": created, "model": model,
+                             "choices": [{"index": 0, "delta": {"role": "assistant", "content": content},
+                                          "finish_reason": "stop" if done else None}]}
+                    self.write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+
+            try:
+                time.sleep(server.ttft + prefill)
+                for token in server.reply_tokens(model, body["messages"]):
+                    event(token)
+                    time.sleep(1 / server.tps)
+                event("", done=True)
+                if not ndjson:
+                    self.write_chunk(b"data: [DONE]\n\n")
+                self.write_chunk(b"")
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True  # client went away mid-stream
+
+
+def expires_at(expiry):
+    """Expiry time in the RFC 3339 form /api/ps reports."""
+    if expiry is None or expiry == float("inf"):
+        return "2318-01-01T00:00:00Z"
+    return datetime.fromtimestamp(expiry, timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def start_mock(host="127.0.0.1", port=0, **settings):
+    """Serve in a background thread; port 0 picks a free one (see server.url)."""
+    server = MockOllama((host, port), **settings)
+    threading.Thread(target=server.serve_forever, name="mock-ollama", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--ttft", type=float, default=0.3, help="seconds before the first token")
+    parser.add_argument("--tps", type=float, default=40.0, help="tokens per second after the first")
+    parser.add_argument("--load-time", type=float, default=0.0, help="extra seconds for a model that is not loaded")
+    parser.add_argument("--parallel", type=int, default=4, help="requests per model generating at once")
+    parser.add_argument("--reply", default=None, help="canned reply (default: echo the user query)")
+    parser.add_argument("--think", action="store_true", help="prefix deepseek-r1 replies with a <think> block")
+    parser.add_argument("--prefill-tps", type=float, default=0.0,
+                        help="prompt tokens per second outside the cached prefix (0: prompt evaluation is free)")
+    parser.add_argument("--num-ctx", type=int, default=2048, help="context size when a request sets no num_ctx")
+    args = parser.parse_args()
+
+    server = MockOllama((args.host, args.port), ttft=args.ttft, tps=args.tps, load_time=args.load_time,
+                        parallel=args.parallel, reply=args.reply, think=args.think,
+                        prefill_tps=args.prefill_tps, num_ctx=args.num_ctx)
+    print(f"Mock Ollama on {server.url} (ttft {args.ttft}s, {args.tps} tokens/s, load {args.load_time}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
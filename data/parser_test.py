@@ -352,7 +352,8 @@ def parse_and_build(user_text: str, func_name: str):
 
     # Return params dict with normalized date values
     if func_name == 'Asaoka_data':
-        return {'id': plates[0], 'SCD': slot_values['SCD'], 'ASD': slot_values['ASD'], 'max_date': slot_values['max_date']}
+        # several plates are assessed as one batch by Func1
+        return {'id': plates[0] if len(plates) == 1 else plates, 'SCD': slot_values['SCD'], 'ASD': slot_values['ASD'], 'max_date': slot_values['max_date']}
     elif func_name == 'reporter_Asaoka':
         return {'ids': plates, 'SCD': slot_values['SCD'], 'ASD': slot_values['ASD'], 'max_date': slot_values['max_date']}
     elif func_name == 'plot_combi_S':
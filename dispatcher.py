@@ -2,6 +2,10 @@ from data.parser_test import parse_and_build, MissingSlot  # refactored for pure
 from llm_main import LLMRouter
 import functions
 from main import choose_function, rule_based_func
+from helpers.jobs import get_job_queue
+
+# functions that produce a PDF and run on the background job queue rather than inline
+JOB_FUNCTIONS = {'reporter_Asaoka', 'plot_combi_S'}
 
 
 class Dispatcher:
@@ -47,7 +51,7 @@ class Dispatcher:
                 collected[ms.slot] = answer
                 aux_ctx += f"\n{ms.slot}: {answer}"
 
-    def run_function(self, func_name, params):
+    def get_function(self, func_name):
         # Map function name to actual function in functions.py
         func_map = {
             'Asaoka_data': functions.Func1,
@@ -55,11 +59,21 @@ class Dispatcher:
             'plot_combi_S': functions.Func3,
             'SM_overview': functions.Func4
         }
-        func = func_map.get(func_name)
+        return func_map.get(func_name)
+
+    def run_function(self, func_name, params):
+        func = self.get_function(func_name)
         if func and params:
             return func(**params)
         return None
 
+    def submit_function(self, func_name, params):
+        """Queue a PDF function on the job queue and return the job id (None if it cannot run)."""
+        func = self.get_function(func_name)
+        if func and params:
+            return get_job_queue().submit(func_name, func, **params)
+        return None
+
     def build_and_send(self, raw_query, func_name, params, func_output):
         classifier_data = {"Function": func_name, "Params": params, "Output": func_output}
         self.llm_router.handle_user(
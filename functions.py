@@ -1,7 +1,10 @@
 from helpers.reporter import reporter_Asaoka
-from helpers.asaoka import Asaoka_data
+from helpers.asaoka import Asaoka_data, Asaoka_batch
 from helpers.settlement_data import reporter_Settlement
 from helpers.datasources import SM_overview
+from helpers.snapshot import asaoka_from_snapshot, asaoka_batch_from_snapshot, overview_from_snapshot
+from helpers.artifacts import get_artifact_store
+from helpers.serializers import serialize_results
 import pprint
 
 
@@ -9,38 +12,62 @@ def Func1(id, SCD, ASD, max_date):
     """Process Asaoka data with given parameters."""
     # Implementation of Asaoka data processing
     try:
-        data = Asaoka_data(id, SCD, ASD, max_date=None, asaoka_days=7, period=0, n=4)
+        # answer from the precomputed snapshot when it is fresh, otherwise assess live
+        if isinstance(id, (list, tuple)):
+            data = asaoka_batch_from_snapshot(id, SCD, ASD)
+            if data is None:
+                data = Asaoka_batch(id, SCD, ASD, max_date=None, asaoka_days=7, period=0, n=4)
+        else:
+            data = asaoka_from_snapshot(id, SCD, ASD)
+            if data is None:
+                data = Asaoka_data(id, SCD, ASD, max_date=None, asaoka_days=7, period=0, n=4)
         print(data)
     except Exception as e:
         print(">>> error <<<\n", e)
-    return f"===USER DATA===\n Processed Asaoka data is given below for your analysis: \n {data}"  
+    return f"===USER DATA===\n Processed Asaoka data is given below for your analysis: \n{serialize_results('Asaoka_data', data)}"  
 
-def Func2(ids, SCD, ASD, max_date):
+def Func2(ids, SCD, ASD, max_date, progress=None):
     """Generate a report for Asaoka data with given parameters."""
     # Implementation of reporter generation
+    token = ""
     try:
-        with open("static/asaoka_report.pdf", "wb") as f:
-            f.write(reporter_Asaoka(ids, SCD, ASD, max_date, n=4, asaoka_days=7, dtick=500))
+        # each request gets its own file so concurrent sessions don't overwrite each other's report
+        store = get_artifact_store()
+        artifact = store.create("asaoka_report.pdf")
+        if reporter_Asaoka(ids, SCD, ASD, max_date, n=4, asaoka_days=7, dtick=500, out=artifact.path,
+                           progress=progress) is None:
+            print("[Warning] No plate could be reported, report not written.")
+            store.discard(artifact)
+        else:
+            token = artifact.token
     except Exception as e:
         print(">>> error <<<\n", e)
-    return "==PDF ALERT==:\n Instruction: Tell the user that a PDF with the data has been made and stored for them to download."
+    return f"==PDF ALERT==:{token}\n Instruction: Tell the user that a PDF with the data has been made and stored for them to download."
 
-def Func3(ids, max_date):
+def Func3(ids, max_date, progress=None):
     """Plot combined data for given ids and max_date."""
     # Implementation of plotting
+    token = ""
+    store = get_artifact_store()
+    artifact = None
     try:
-        with open("static/Combined_settlement_plot.pdf", "wb") as f:
-            f.write(reporter_Settlement(ids, max_date))
+        artifact = store.create("Combined_settlement_plot.pdf")
+        reporter_Settlement(ids, max_date, out=artifact.path, progress=progress)
+        token = artifact.token
     except Exception as e:
         print(">>> error <<<\n", e)
-    return f"==PDF ALERT==:\n Instruction: Tell the user that an IMAGE with the plotted graphs has been made and stored for them to download."
+        if artifact is not None:
+            store.discard(artifact)
+    return f"==PDF ALERT==:{token}\n Instruction: Tell the user that an IMAGE with the plotted graphs has been made and stored for them to download."
 
 def Func4(ids):
     try:
-        data = SM_overview(ids)
-        pprint.pp(data)
+        data = overview_from_snapshot(ids)
+        if data is None:
+            # print each chunk of plates as it arrives rather than the whole site at the end
+            data = SM_overview(ids, on_chunk=lambda chunk, part: pprint.pp(part))
     except Exception as e:
         print(">>> error <<<\n", e)
-    return f"===USER DATA===\n Processed Settlement Plate data for all the plates are given below for your analysis: \n {data}" 
+    return f"===USER DATA===\n Processed Settlement Plate data for all the plates are given below for your analysis: \n{serialize_results('SM_overview', data)}" 
 
 
@@ -0,0 +1,119 @@
+"""
+Per-request storage for generated reports.
+
+Every report gets its own directory, static/artifacts/<id>/<filename>, so concurrent sessions never
+write over each other. Functions hand the UI an [artifact:<id>] token in their output and the UI
+resolves it back to the file for download. Old artifacts are removed on a time and size budget.
+"""
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+ARTIFACT_DIR = os.environ.get("NL2FUNC_ARTIFACT_DIR", os.path.join("static", "artifacts"))
+ARTIFACT_MAX_AGE = int(os.environ.get("NL2FUNC_ARTIFACT_MAX_AGE", 24 * 3600))  # seconds
+ARTIFACT_MAX_MB = int(os.environ.get("NL2FUNC_ARTIFACT_MAX_MB", 1024))
+
+TOKEN_PATTERN = re.compile(r"\[artifact:([0-9a-f]{32})\]")
+
+
+def find_artifacts(text):
+    """Artifact ids referenced in a function output or chat message, in order."""
+    return TOKEN_PATTERN.findall(text or "")
+
+
+def strip_artifacts(text):
+    return TOKEN_PATTERN.sub("", text or "").strip()
+
+
+class Artifact:
+    def __init__(self, id, filename, path):
+        self.id = id
+        self.filename = filename
+        self.path = path
+
+    @property
+    def token(self):
+        return f"[artifact:{self.id}]"
+
+
+class ArtifactStore:
+    def __init__(self, directory=ARTIFACT_DIR, max_age=ARTIFACT_MAX_AGE, max_bytes=ARTIFACT_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def create(self, filename):
+        """
+        Reserve a fresh location for one output file. Write it atomically (to a temp name, then
+        os.replace onto artifact.path) so a download never sees a half-written file.
+        """
+        self.gc()
+        id = uuid.uuid4().hex
+        directory = os.path.join(self.directory, id)
+        os.makedirs(directory)
+        return Artifact(id, filename, os.path.join(directory, filename))
+
+    def discard(self, artifact):
+        """Drop an artifact that was never written (e.g. the report had nothing to show)."""
+        shutil.rmtree(os.path.dirname(artifact.path), ignore_errors=True)
+
+    def path(self, id):
+        """Path of a finished artifact, or None if the id is unknown, unfinished or collected."""
+        if not re.fullmatch(r"[0-9a-f]{32}", id or ""):
+            return None
+        directory = os.path.join(self.directory, id)
+        try:
+            names = [n for n in os.listdir(directory) if not n.endswith(".tmp")]
+        except FileNotFoundError:
+            return None
+        return os.path.join(directory, names[0]) if names else None
+
+    def _artifacts(self):
+        """[(modified, size, directory)] oldest first."""
+        out = []
+        try:
+            ids = os.listdir(self.directory)
+        except FileNotFoundError:
+            return out
+        for id in ids:
+            directory = os.path.join(self.directory, id)
+            try:
+                files = [os.stat(os.path.join(directory, n)) for n in os.listdir(directory)]
+                modified = max([f.st_mtime for f in files] + [os.stat(directory).st_mtime])
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            out.append((modified, sum(f.st_size for f in files), directory))
+        return sorted(out)
+
+    def gc(self):
+        """Delete artifacts older than max_age, then the oldest ones until the store fits in max_bytes."""
+        with self._lock:
+            artifacts = self._artifacts()
+            now = time.time()
+            total = sum(a[1] for a in artifacts)
+            removed = 0
+            for modified, size, directory in artifacts:
+                if now - modified <= self.max_age and total <= self.max_bytes:
+                    break
+                shutil.rmtree(directory, ignore_errors=True)
+                total -= size
+                removed += 1
+            if removed:
+                print(f"[DEBUG][Artifacts] removed {removed} old artifacts")
+            return removed
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ArtifactStore()
+        return _store
@@ -1,16 +1,15 @@
-import pyodbc
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import itertools
 import pprint
 
-from helpers.datasources import SQLconnect
+from helpers.datasources import plate_readings, plate_info, plate_context
+from helpers.data_structures import map_plates, PLATE_WORKERS
 
-def check_surcharge(id, SCD):
-    EngDep, cursorED = SQLconnect('EngDep')
-    df = pd.read_sql(f'''Select DateTime, Settlement, GroundLevel from MON_DISPLACEMENT_READINGS where 
-    PointID='{id}' and Datetime >= '{SCD}' ''', EngDep)
+def check_surcharge(id, SCD, readings=None):
+    rows = readings.since(SCD) if readings is not None else plate_readings(id, start=SCD)
+    df = pd.DataFrame.from_records([r[:3] for r in rows], columns=['DateTime', 'Settlement', 'GroundLevel'])
     df['DateTime'] = pd.to_datetime(df['DateTime'])
 
     # calculate the difference between rows along the Ground Level (mCD) column
@@ -20,7 +19,6 @@ def check_surcharge(id, SCD):
     df = df[df['Difference'] < -2.5]
 
     # return the datetime value of the filtered dataframe
-    cursorED.close()
     if len(df['DateTime']) > 0:
         return (min(df['DateTime']))
     else:
@@ -44,39 +42,31 @@ def prev_monday(d):
         return d
 
 
-def search(ID, d, Te, n=3):  # for a given date, search for readings within n-days before
-    EngDep, cursorED = SQLconnect('EngDep')
+def search(ID, d, Te, n=3, readings=None):  # for a given date, search for readings within n-days before
+    if readings is None:
+        readings = plate_context(ID)
+    settled = readings.settled
     out = {}
     for d in d:
         if Te is not None:
             if d <= Te:
                 for i in range(0, n + 1):
                     s_d = d + timedelta(days=i)
-                    cursorED.execute(
-                        f'''Select Settlement, Datetime from MON_DISPLACEMENT_READINGS where PointID = '{ID}' and DateTime = '{s_d}' and Settlement is not NULL ''')
-                    read = cursorED.fetchone()
-                    if read is not None:
-                        out[read[1]] = -read[0]
+                    if s_d in settled:
+                        out[s_d] = -settled[s_d]
                         break
         else:
             for i in range(0, n + 1):
                 s_d = d + timedelta(days=i)
-                cursorED.execute(
-                    f'''Select Settlement, Datetime from MON_DISPLACEMENT_READINGS where PointID = '{ID}' and DateTime = '{s_d}' and Settlement is not NULL ''')
-                read = cursorED.fetchone()
-                if read is not None:
-                    out[read[1]] = -read[0]
+                if s_d in settled:
+                    out[s_d] = -settled[s_d]
                     break
     return out
 
 
-def Asaoka_data(id, SCD, ASD, max_date=None, asaoka_days=7, period=0, n=4):  # all plates
-
-    EngDep, cursorED = SQLconnect('EngDep')
-
-    Surchcompl = pd.read_sql_query(
-        f'''Select PointID, Surcharge_complete_date, Asaoka_Start_Date from SettlementPlates where PointID = '{id}' and Surcharge_complete_date is not null ''',
-        EngDep)
+def Asaoka_data(id, SCD, ASD, max_date=None, asaoka_days=7, period=0, n=4, info=None, readings=None):  # all plates
+    # info (plate_info DataFrame) and readings (PlateReadings) default to the active datasource's
+    Surchcompl = plate_info(id) if info is None else info
     if len(Surchcompl["PointID"]) != 0:
         if len(Surchcompl['Asaoka_Start_Date']) != 0:
             if SCD is None:
@@ -87,7 +77,9 @@ def Asaoka_data(id, SCD, ASD, max_date=None, asaoka_days=7, period=0, n=4):  # a
             SCD = datetime.strptime(SCD, "%Y-%m-%d")
             ASD = datetime.strptime(ASD, "%Y-%m-%d")
 
-            Te = check_surcharge(id, SCD)
+            if readings is None:
+                readings = plate_context(id)
+            Te = check_surcharge(id, SCD, readings)
 
             if max_date is not None:
                 max_date = datetime.strptime(max_date, "%Y-%m-%d")
@@ -99,8 +91,7 @@ def Asaoka_data(id, SCD, ASD, max_date=None, asaoka_days=7, period=0, n=4):  # a
             else:
                 max_date = datetime.now()
 
-            cursorED.execute('SELECT TOP (1) Datetime, Settlement, GroundLevel FROM MON_DISPLACEMENT_READINGS WHERE PointID = ? AND Datetime <= ? AND Settlement is not NULL order by Datetime DESC', (id, max_date))
-            fetch = cursorED.fetchone()
+            fetch = readings.latest(max_date)
             Datetime, latest_settl, latest_GL = fetch[0], fetch[1], fetch[2]
             latest_settl = latest_settl * (0.001)       # convert to [m] from [mm]
 
@@ -122,8 +113,8 @@ def Asaoka_data(id, SCD, ASD, max_date=None, asaoka_days=7, period=0, n=4):  # a
                     stdates.append(date)
                     prevdates.append(prev)
                     date += timedelta(days=asaoka_days)
-                    y = search(id, stdates, Te, n)
-                    x = search(id, prevdates, Te, n)
+                y = search(id, stdates, Te, n, readings)
+                x = search(id, prevdates, Te, n, readings)
             else:
                 return {"PointID": id,
                         "SCD": SCD,
@@ -191,7 +182,6 @@ def Asaoka_data(id, SCD, ASD, max_date=None, asaoka_days=7, period=0, n=4):  # a
             #     err.append(['SQL/pyodbc Error: Unable to update database'])
             # except ArithmeticError:
             #     err.append(['ArithmeticError: Computational errors'])
-            cursorED.close()
             if err:
                 return {"PointID": id,
                         "SCD": SCD,
@@ -242,3 +232,30 @@ def Asaoka_data(id, SCD, ASD, max_date=None, asaoka_days=7, period=0, n=4):  # a
                 "Latest_date": None,
                 "max_date": None,
                 "Errors": 'Unidentified Settlement Plate'}
+
+
+def Asaoka_batch(ids, SCD, ASD, max_date=None, asaoka_days=7, period=0, n=4, max_workers=PLATE_WORKERS):
+    """
+    Asaoka_data for several plates, run concurrently. Results follow the order of ids; a plate that
+    fails is returned as an entry with its error under "Errors" instead of aborting the batch.
+    """
+    results = map_plates(lambda id: Asaoka_data(id, SCD, ASD, max_date, asaoka_days, period, n), ids, max_workers)
+    for i, (id, result) in enumerate(zip(ids, results)):
+        if isinstance(result, Exception):
+            results[i] = {"PointID": id,
+                          "SCD": None,
+                          "ASD": None,
+                          "pairs": None,
+                          "dates": None,
+                          "m": None,
+                          "b": None,
+                          "SCD_s": None,
+                          "R2_score": None,
+                          "Asaoka_pred": None,
+                          "DOC": None,
+                          "Latest_Settlement": None,
+                          "Latest_GL": None,
+                          "Latest_date": None,
+                          "max_date": None,
+                          "Errors": f"{type(result).__name__}: {result}"}
+    return results
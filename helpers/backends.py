@@ -0,0 +1,258 @@
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+import pandas as pd
+
+from helpers.data_structures import PlateReadings
+from helpers.http_client import CachedHTTPClient
+from helpers.readings_cache import ReadingsCache, CACHE_DIR, to_db_datetime, from_db_datetime
+
+# Which backend helpers/ reads from: "geobase" (site SQL Server + metrics API, default)
+# or "sqlite:<path>" for a local database, e.g. one built by helpers/synthetic.py.
+DATASOURCE = os.environ.get("NL2FUNC_DATASOURCE", "geobase")
+METRICS_TTL = int(os.environ.get("NL2FUNC_METRICS_TTL", 300))  # seconds an SM metrics response stays cached
+
+
+class Datasource(ABC):
+    """
+    Everything helpers/ needs from the site systems: settlement readings, SettlementPlates
+    metadata and the SM metrics/overview endpoints.
+    """
+    name = "base"
+
+    def __init__(self):
+        self._cache = None
+
+    @property
+    def cache(self):
+        """Local readings cache for this backend, created on first use."""
+        if self._cache is None:
+            path = os.path.join(CACHE_DIR, f"readings-{self.name}.sqlite")
+            self._cache = ReadingsCache(path, self.readings_since)
+        return self._cache
+
+    @abstractmethod
+    def readings_since(self, id, since=None):
+        """[(Datetime, Settlement, GroundLevel, Remark), ...] with Datetime > since, ascending."""
+
+    @abstractmethod
+    def latest_readings(self, ids):
+        """{PointID: Datetime of its latest reading} for the plates that have readings, in one query per chunk."""
+
+    @abstractmethod
+    def plate_ids(self):
+        """Every PointID in SettlementPlates."""
+
+    @abstractmethod
+    def plate_info(self, id):
+        """DataFrame of PointID, Surcharge_complete_date, Asaoka_Start_Date (empty if the plate is unknown)."""
+
+    @abstractmethod
+    def sm_metrics(self, id):
+        """SM metrics for one plate, as served by the metrics API /sm/<id>."""
+
+    @abstractmethod
+    def sm_overview(self, ids):
+        """SM overview rows for the plates, as served by the metrics API /settlement-summary/<ids>."""
+
+
+class GeobaseDatasource(Datasource):
+    """Site SQL Server (EngDep) for readings and plate metadata, HTTP API for SM metrics."""
+    name = "geobase"
+
+    def __init__(self, db_server='172.16.181.2\\geobase', api_url="http://172.16.181.2:8887"):
+        super().__init__()
+        self.db_server = db_server
+        self.api_url = api_url
+        self.http = CachedHTTPClient(api_url, ttl=METRICS_TTL)
+
+    def connect(self, database_name):
+        import pyodbc
+        user = 'api'
+        pw = 'api'
+        cnxn = pyodbc.connect(
+            'DRIVER={SQL Server};SERVER=' + self.db_server + ';DATABASE=' + database_name + ';UID=' + user + ';PWD=' + pw)
+        cursor = cnxn.cursor()
+        return cnxn, cursor
+
+    def readings_since(self, id, since=None):
+        EngDep, CursorED = self.connect('EngDep')
+        if since is None:
+            CursorED.execute(
+                '''SELECT Datetime, Settlement, GroundLevel, Remark from MON_DISPLACEMENT_READINGS where
+                PointID = ? order by DateTime ASC''', (id))
+        else:
+            CursorED.execute(
+                '''SELECT Datetime, Settlement, GroundLevel, Remark from MON_DISPLACEMENT_READINGS where
+                PointID = ? and Datetime > ? order by DateTime ASC''', (id, since))
+        rows = CursorED.fetchall()
+        CursorED.close()
+        return rows
+
+    def latest_readings(self, ids):
+        ids = list(ids)
+        latest = {}
+        EngDep, CursorED = self.connect('EngDep')
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            CursorED.execute(
+                f'''SELECT PointID, MAX(Datetime) from MON_DISPLACEMENT_READINGS where
+                PointID in ({', '.join('?' * len(chunk))}) group by PointID''', chunk)
+            latest.update((r[0], r[1]) for r in CursorED.fetchall())
+        CursorED.close()
+        return latest
+
+    def plate_ids(self):
+        EngDep, CursorED = self.connect('EngDep')
+        CursorED.execute("Select PointID from SettlementPlates order by PointID")
+        ids = [r[0] for r in CursorED.fetchall()]
+        CursorED.close()
+        return ids
+
+    def plate_info(self, id):
+        EngDep, CursorED = self.connect('EngDep')
+        df = pd.read_sql_query(
+            '''Select PointID, Surcharge_complete_date, Asaoka_Start_Date from SettlementPlates where PointID = ? and Surcharge_complete_date is not null ''',
+            EngDep, params=[id])
+        CursorED.close()
+        return df
+
+    def sm_metrics(self, id):
+        return self.http.get_json(f"/sm/{id}", key=("sm", id))
+
+    def sm_overview(self, ids):
+        ids = [str(i) for i in ids]
+        return self.http.get_json(f"/settlement-summary/{','.join(ids)}", key=("overview", tuple(ids)))
+
+
+class SQLiteDatasource(Datasource):
+    """
+    Local stand-in for the site systems. Uses the same table names as EngDep
+    (MON_DISPLACEMENT_READINGS, SettlementPlates) and computes the SM metrics/overview
+    payloads in-process, so the whole pipeline runs without network access.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.name = "sqlite-" + os.path.splitext(os.path.basename(path))[0]
+        self._local = threading.local()
+
+    def connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def readings_since(self, id, since=None):
+        query = "SELECT Datetime, Settlement, GroundLevel, Remark FROM MON_DISPLACEMENT_READINGS WHERE PointID = ?"
+        args = [id]
+        if since is not None:
+            query += " AND Datetime > ?"
+            args.append(to_db_datetime(since))
+        query += " ORDER BY Datetime ASC"
+        rows = self.connect().execute(query, args).fetchall()
+        return [(from_db_datetime(r[0]), r[1], r[2], r[3]) for r in rows]
+
+    def latest_readings(self, ids):
+        ids = list(ids)
+        latest = {}
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            query = (f"SELECT PointID, MAX(Datetime) FROM MON_DISPLACEMENT_READINGS "
+                     f"WHERE PointID IN ({', '.join('?' * len(chunk))}) GROUP BY PointID")
+            latest.update((r[0], from_db_datetime(r[1])) for r in self.connect().execute(query, chunk))
+        return latest
+
+    def plate_ids(self):
+        return [r[0] for r in self.connect().execute("SELECT PointID FROM SettlementPlates ORDER BY PointID")]
+
+    def plate_info(self, id):
+        return pd.read_sql_query(
+            '''Select PointID, Surcharge_complete_date, Asaoka_Start_Date from SettlementPlates where PointID = ? and Surcharge_complete_date is not null ''',
+            self.connect(), params=[id])
+
+    def _plate_row(self, id):
+        return self.connect().execute(
+            "SELECT Surcharge_complete_date, Easting, Northing FROM SettlementPlates WHERE PointID = ?", (id,)).fetchone()
+
+    def sm_metrics(self, id):
+        plate = self._plate_row(id)
+        settled = [r for r in self.readings_since(id) if r[1] is not None]
+        if plate is None or not settled:
+            return None
+        latest = settled[-1]
+        return {"PointID": id,
+                "Easting": plate[1],
+                "Northing": plate[2],
+                "Final_S": latest[1] * 0.001,
+                "GL": latest[2],
+                "Latest_Date": latest[0].strftime("%Y-%m-%d")}
+
+    def sm_overview(self, ids):
+        from helpers.asaoka import Asaoka_data
+
+        out = []
+        for id in ids:
+            plate = self._plate_row(id)
+            readings = PlateReadings(id, self.readings_since(id))
+            latest = readings.latest()
+            if plate is None or latest is None:
+                continue
+            latest_date, latest_settl, latest_GL = latest[0], latest[1], latest[2]
+            rate = readings.settlement_rate(7)
+            SCD = datetime.strptime(plate[0], "%Y-%m-%d") if plate[0] else None
+            # this backend's own plate info and readings, whichever datasource is active
+            asaoka = Asaoka_data(id, None, None, info=self.plate_info(id), readings=readings)
+            out.append({"PointID": id,
+                        "latest_Settlement": round(latest_settl * 0.001, 3),
+                        "Latest_GL": round(latest_GL, 2),
+                        "Latest_Date": latest_date.strftime("%Y-%m-%d"),
+                        "Asaoka_DOC": asaoka["DOC"],
+                        "Surcharge_Complete_Date": plate[0],
+                        "Holding_period": (latest_date - SCD).days if SCD else None,
+                        "7day_rate": round(rate, 1) if rate is not None else None})
+        return out
+
+
+_datasource = None
+_datasource_lock = threading.Lock()
+
+
+def make_datasource(spec):
+    if spec == "geobase":
+        return GeobaseDatasource()
+    if spec.startswith("sqlite:"):
+        return SQLiteDatasource(spec[len("sqlite:"):])
+    raise ValueError(f"Unknown datasource: {spec}")
+
+
+def get_datasource():
+    global _datasource
+    with _datasource_lock:
+        if _datasource is None:
+            _datasource = make_datasource(DATASOURCE)
+        return _datasource
+
+
+def readings_version(ids, sync=False):
+    """
+    Latest reading time across the plates in the active backend's readings cache, as text (None if
+    none are cached). Anything derived from those plates' readings is current for this version.
+    """
+    latest = [dt for dt in get_datasource().cache.latest_datetimes(ids, sync=sync).values() if dt is not None]
+    return to_db_datetime(max(latest)) if latest else None
+
+
+def set_datasource(datasource):
+    """Swap the active backend (a Datasource instance or a spec string like 'sqlite:site.sqlite')."""
+    global _datasource
+    if isinstance(datasource, str):
+        datasource = make_datasource(datasource)
+    with _datasource_lock:
+        _datasource = datasource
+    return datasource
@@ -1,6 +1,14 @@
+import os
+import shutil
+import tempfile
 from io import BytesIO
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import PyPDF2
 
+PLATE_WORKERS = 8  # per-plate work is I/O-bound (ODBC/HTTP), so threads are enough
+
 def str_parser(string, delimiter, ignore_spaces=True):
     output = list()
     if ignore_spaces:
@@ -9,7 +17,159 @@ def str_parser(string, delimiter, ignore_spaces=True):
         string = string
     return string.split(delimiter)
 
-def merge_pdfs_to_bytes(merged_pdf: PyPDF2.PdfMerger) -> bytes:
-    output_buffer = BytesIO()
-    merged_pdf.write(output_buffer)
-    return output_buffer.getvalue()
\ No newline at end of file
+def map_plates(fn, ids, max_workers=PLATE_WORKERS):
+    """
+    Runs fn(id) for every plate on a bounded thread pool and returns the results in the order of ids.
+    A plate that raises gets its exception in place of a result, so one bad plate does not abort the batch.
+    """
+    def run(id):
+        try:
+            return fn(id)
+        except Exception as e:
+            return e
+
+    ids = list(ids)
+    if len(ids) <= 1:
+        return [run(id) for id in ids]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(ids))) as pool:
+        return list(pool.map(run, ids))
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling: indices of at most `threshold` points of (x, y)
+    that keep the visual shape of the series. x must be numeric and ascending.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)  # threshold - 2 buckets between the end points
+    out = [0]
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # average of the next bucket (the last point for the final bucket)
+        nxt_start, nxt_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = x[nxt_start:nxt_end].mean(), y[nxt_start:nxt_end].mean()
+        area = np.abs((x[a] - cx) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (cy - y[a]))
+        a = start + int(area.argmax())
+        out.append(a)
+    out.append(n - 1)
+    return np.array(out)
+
+def downsample_series(x, y, max_points):
+    """
+    Indices to plot for one series: LTTB down to max_points, always keeping the minimum,
+    the maximum and the latest reading. Missing y values are dropped once downsampling kicks in.
+    """
+    y = np.asarray(y, dtype=float)
+    valid = np.flatnonzero(~np.isnan(y))
+    if not max_points or len(y) <= max_points or len(valid) == 0:
+        return np.arange(len(y))
+    keep = valid[lttb(np.asarray(x, dtype=float)[valid], y[valid], max(max_points - 2, 3))]
+    extremes = [valid[y[valid].argmin()], valid[y[valid].argmax()], valid[-1]]
+    return np.unique(np.concatenate([keep, extremes]))
+
+class PageSpool:
+    """
+    Rendered PDF pages parked in a temp directory until the report is assembled, so pages are
+    not held in memory while the rest of the report renders. write() merges straight from the
+    spooled files into the output path or file-like sink.
+    """
+
+    def __init__(self):
+        self.directory = tempfile.mkdtemp(prefix="nl2func-pages-")
+        self._count = 0
+
+    def _next_path(self):
+        self._count += 1
+        return os.path.join(self.directory, f"{self._count:05d}.pdf")
+
+    def add(self, data: bytes) -> str:
+        path = self._next_path()
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def add_file(self, path) -> str:
+        """Copy an existing PDF (e.g. a cached page) into the spool."""
+        spooled = self._next_path()
+        shutil.copyfile(path, spooled)
+        return spooled
+
+    def write(self, paths, out=None):
+        """
+        Merge the spooled files in `paths` order into `out` (a path or writable file object) and return it.
+        With out=None the document is returned as bytes.
+        """
+        merger = PyPDF2.PdfMerger()
+        try:
+            for path in paths:
+                merger.append(path)  # opened as a file stream, read on demand while writing
+            if out is None:
+                buffer = BytesIO()
+                merger.write(buffer)
+                return buffer.getvalue()
+            if isinstance(out, (str, os.PathLike)):
+                # write next to the target and swap in, so a half-written report is never served
+                tmp = f"{out}.{os.getpid()}.tmp"
+                merger.write(tmp)
+                os.replace(tmp, out)
+            else:
+                merger.write(out)
+            return out
+        finally:
+            merger.close()
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class PlateReadings:
+    """
+    All readings for one plate, fetched once per request and shared by the Asaoka steps
+    (surcharge removal, latest reading and pair search).
+    rows: [(Datetime, Settlement, GroundLevel, Remark), ...] in ascending Datetime order.
+    """
+
+    def __init__(self, id, rows):
+        self.id = id
+        self.rows = rows
+        self._settled = None
+
+    def since(self, start):
+        return [r for r in self.rows if r[0] >= start]
+
+    @property
+    def settled(self):
+        """{Datetime: Settlement} for readings with a settlement value (first reading wins on duplicates)."""
+        if self._settled is None:
+            self._settled = {}
+            for r in self.rows:
+                if r[1] is not None:
+                    self._settled.setdefault(r[0], r[1])
+        return self._settled
+
+    def latest(self, end=None):
+        """Latest reading with a settlement value at or before `end`, or None."""
+        for r in reversed(self.rows):
+            if r[1] is not None and (end is None or r[0] <= end):
+                return r
+        return None
+
+    def settlement_rate(self, days=7):
+        """Absolute settlement (mm) over the `days` before the latest reading, or None without enough history."""
+        latest = self.latest()
+        if latest is None:
+            return None
+        cutoff = latest[0] - timedelta(days=days)
+        previous = self.latest(cutoff)
+        if previous is None:
+            return None
+        return abs(latest[1] - previous[1])
@@ -1,30 +1,32 @@
-import pyodbc
 import pandas as pd
-import requests
 from datetime import datetime as dt
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from helpers.backends import GeobaseDatasource, get_datasource
+from helpers.data_structures import PlateReadings
+
+OVERVIEW_CHUNK_SIZE = 50     # plates per /settlement-summary request
+OVERVIEW_MAX_CHARS = 1500    # keeps the joined ID path segment well inside URL length limits
+OVERVIEW_WORKERS = 4         # concurrent overview requests
 
 def SQLconnect(database_name):
-    db_server = '172.16.181.2\geobase'
-    db_name = database_name
-    user = 'api'
-    pw = 'api'
-    cnxn = pyodbc.connect(
-        'DRIVER={SQL Server};SERVER=' + db_server + ';DATABASE=' + db_name + ';UID=' + user + ';PWD=' + pw)
-    cursor = cnxn.cursor()
-    return cnxn, cursor
+    return GeobaseDatasource().connect(database_name)
+
+def plate_readings(id, start=None, end=None, settled_only=False):
+    """Readings for one plate through the local cache of the active datasource."""
+    return get_datasource().cache.readings(id, start=start, end=end, settled_only=settled_only)
+
+def plate_context(id):
+    """Fetch a plate's readings once for use across one request."""
+    return PlateReadings(id, plate_readings(id))
+
+def plate_info(id):
+    return get_datasource().plate_info(id)
+
 def S_series(ids: list, max_date=None):
-    EngDep, CursorED = SQLconnect('EngDep')
     data = []
     for id in ids:
-        if max_date is None:
-            CursorED.execute(
-                '''SELECT Datetime, Settlement, GroundLevel, Remark from MON_DISPLACEMENT_READINGS where 
-                PointID = ? order by DateTime ASC''', (id))
-        else:
-            CursorED.execute(
-                '''SELECT Datetime, Settlement, GroundLevel, Remark from MON_DISPLACEMENT_READINGS where 
-                PointID = ? and Datetime <= ? order by DateTime ASC''', (id, max_date))
-        data_st = CursorED.fetchall()
+        data_st = plate_readings(id, end=max_date)
         for i in data_st:
             int_lst = []
             dd = i[0]
@@ -34,20 +36,71 @@ def S_series(ids: list, max_date=None):
             int_lst.append(i[2])
             int_lst.append(i[3])
             data.append(int_lst)
-    CursorED.close()
     df_S = pd.DataFrame.from_records(data, columns=['id', 'Date', 'Settlement (mm)', 'Ground Level (mCD)', 'Remarks'])
-    df_S['Date'] = df_S['Date'].dt.date
+    df_S['Date'] = pd.to_datetime(df_S['Date']).dt.date  # to_datetime so a plate set with no readings still works
     return df_S
 
 def SM_metrics(id: str):
-    response = requests.get(f"http://172.16.181.2:8887/sm/{id}")
-    if response.status_code == 200:
-        data = response.json()
-        return data
-
-def SM_overview(ids: list):
-    ids = ','.join(str(i) for i in ids)
-    response = requests.get(f"http://172.16.181.2:8887/settlement-summary/{ids}")
-    if response.status_code == 200:
-        data = response.json()
-        return data
\ No newline at end of file
+    return get_datasource().sm_metrics(id)
+
+def overview_chunks(ids, chunk_size=OVERVIEW_CHUNK_SIZE, max_chars=OVERVIEW_MAX_CHARS):
+    """Split plate IDs into requests of at most chunk_size IDs and max_chars of comma-joined path."""
+    chunks, current, length = [], [], 0
+    for id in ids:
+        id = str(id)
+        if current and (len(current) >= chunk_size or length + 1 + len(id) > max_chars):
+            chunks.append(current)
+            current, length = [], 0
+        length += len(id) + (1 if current else 0)
+        current.append(id)
+    if current:
+        chunks.append(current)
+    return chunks
+
+def iter_overview(ids, chunk_size=OVERVIEW_CHUNK_SIZE, max_workers=OVERVIEW_WORKERS):
+    """
+    Fetches the overview in chunks, at most max_workers requests at a time, and yields
+    (chunk_index, chunk_ids, data) as each chunk completes. data is None for a failed chunk.
+    """
+    chunks = overview_chunks(ids, chunk_size)
+    if not chunks:
+        return
+    datasource = get_datasource()
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+        futures = {pool.submit(datasource.sm_overview, chunk): i for i, chunk in enumerate(chunks)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                data = future.result()
+            except Exception as e:
+                print(f"[Warning] Overview chunk {i + 1}/{len(chunks)} failed: {e}")
+                data = None
+            yield i, chunks[i], data
+
+def merge_overview(parts):
+    """Merge per-chunk overview payloads (lists or dicts) in chunk order."""
+    parts = [p for p in parts if p is not None]
+    if not parts:
+        return None
+    if all(isinstance(p, list) for p in parts):
+        return [row for p in parts for row in p]
+    if all(isinstance(p, dict) for p in parts):
+        merged = {}
+        for p in parts:
+            merged.update(p)
+        return merged
+    return parts
+
+def SM_overview(ids: list, on_chunk=None):
+    """
+    Overview for any number of plates. Large ID lists are split into chunks that are fetched
+    concurrently; on_chunk(chunk_ids, data) is called as each one arrives, and the merged
+    result keeps the original plate order.
+    """
+    ids = list(ids)
+    parts = [None] * len(overview_chunks(ids))
+    for i, chunk, data in iter_overview(ids):
+        parts[i] = data
+        if on_chunk is not None:
+            on_chunk(chunk, data)
+    return merge_overview(parts)
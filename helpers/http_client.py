@@ -0,0 +1,124 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class _Flight:
+    """One in-progress fetch that concurrent callers for the same key wait on."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class CachedHTTPClient:
+    """
+    Shared keep-alive client for the settlement metrics API.
+
+    - one pooled requests.Session with timeouts and retries on transient errors
+    - TTL response cache keyed per plate/request (metrics only move when new readings land)
+    - concurrent requests for the same key collapse into a single in-flight fetch
+    - hit/miss/latency counters via stats()
+    """
+
+    def __init__(self, base_url, ttl=300, timeout=(3.05, 30), retries=3, pool_size=16, max_entries=4096):
+        self.base_url = base_url.rstrip("/")
+        self.ttl = ttl
+        self.timeout = timeout
+        self.max_entries = max_entries
+
+        self.session = requests.Session()
+        # raise_on_status=False: once retries run out, the last 5xx response comes back to _fetch
+        # (which returns None for it) instead of surfacing as a RetryError
+        retry = Retry(total=retries, backoff_factor=0.3, status_forcelist=(502, 503, 504), allowed_methods=("GET",),
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._cache = {}      # key -> (expires_at, data)
+        self._inflight = {}   # key -> _Flight
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0,
+                          "requests": 0, "latency_total": 0.0, "latency_max": 0.0}
+
+    def get_json(self, path, key=None):
+        """GET base_url + path and return the decoded JSON (None on a non-200 response)."""
+        key = key if key is not None else path
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._counters["hits"] += 1
+                return entry[1]
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+                self._counters["misses"] += 1
+            else:
+                self._counters["coalesced"] += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self._fetch(path)
+            if flight.result is not None:
+                self._store(key, flight.result)
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self._counters["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+        return flight.result
+
+    def _fetch(self, path):
+        t0 = time.perf_counter()
+        response = self.session.get(self.base_url + path, timeout=self.timeout)
+        elapsed = time.perf_counter() - t0
+        with self._lock:
+            self._counters["requests"] += 1
+            self._counters["latency_total"] += elapsed
+            self._counters["latency_max"] = max(self._counters["latency_max"], elapsed)
+        if response.status_code == 200:
+            return response.json()
+        return None
+
+    def _store(self, key, data):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._cache) >= self.max_entries:
+                self._cache = {k: v for k, v in self._cache.items() if v[0] > now}
+                if len(self._cache) >= self.max_entries:
+                    # still full of live entries: drop the ones closest to expiry
+                    for k, _ in sorted(self._cache.items(), key=lambda kv: kv[1][0])[:self.max_entries // 4]:
+                        del self._cache[k]
+            self._cache[key] = (now + self.ttl, data)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            c = dict(self._counters)
+            c["cached"] = len(self._cache)
+        lookups = c["hits"] + c["misses"] + c["coalesced"]
+        c["hit_rate"] = round((c["hits"] + c["coalesced"]) / lookups, 3) if lookups else 0.0
+        c["latency_avg"] = round(c["latency_total"] / c["requests"], 4) if c["requests"] else 0.0
+        return c
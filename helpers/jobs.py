@@ -0,0 +1,122 @@
+"""
+Background job queue for report generation.
+
+The app submits reporter_Asaoka / plot_combi_S runs here instead of rendering inside the Streamlit
+script run, gets a job id back straight away and polls the job for progress and its result. At most
+JOB_WORKERS jobs run at once across all sessions; the rest wait in the queue.
+"""
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_WORKERS = int(os.environ.get("NL2FUNC_JOB_WORKERS", 2))
+JOB_TTL = int(os.environ.get("NL2FUNC_JOB_TTL", 3600))  # seconds a finished job stays queryable
+
+TOKEN_PATTERN = re.compile(r"\[job:([0-9a-f]{32})\]")
+
+
+def find_jobs(text):
+    return TOKEN_PATTERN.findall(text or "")
+
+
+def strip_jobs(text):
+    return TOKEN_PATTERN.sub("", text or "").strip()
+
+
+class Job:
+    def __init__(self, name):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.status = "queued"   # queued -> running -> done | failed
+        self.done = 0
+        self.total = 0
+        self.message = None
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+
+    @property
+    def token(self):
+        return f"[job:{self.id}]"
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    @property
+    def fraction(self):
+        if self.finished:
+            return 1.0
+        return self.done / self.total if self.total else 0.0
+
+    def update(self, done, total, message=None):
+        """Progress callback handed to the job function: `done` of `total` steps finished."""
+        self.done, self.total = done, total
+        if message is not None:
+            self.message = message
+
+
+class JobQueue:
+    def __init__(self, max_workers=JOB_WORKERS, ttl=JOB_TTL):
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, name, fn, *args, **kwargs):
+        """Queue fn(*args, progress=job.update, **kwargs) and return the job id."""
+        self._prune()
+        job = Job(name)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, fn, args, kwargs)
+        print(f"[DEBUG][Jobs] queued {name} as {job.id}")
+        return job.id
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = "running"
+        t0 = time.perf_counter()
+        try:
+            job.result = fn(*args, progress=job.update, **kwargs)
+            job.status = "done"
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = "failed"
+            print(f"[Warning] Job {job.name} ({job.id}) failed: {job.error}")
+        finally:
+            job.finished_at = time.time()
+        print(f"[DEBUG][Jobs] {job.name} {job.id} {job.status} in {time.perf_counter() - t0:.1f} s")
+
+    def get(self, id):
+        with self._lock:
+            return self._jobs.get(id)
+
+    def _prune(self):
+        now = time.time()
+        with self._lock:
+            for id in [id for id, job in self._jobs.items() if job.finished and now - job.finished_at > self.ttl]:
+                del self._jobs[id]
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        for job in jobs:
+            counts[job.status] += 1
+        return counts
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
@@ -0,0 +1,174 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, date
+
+# Local mirror of MON_DISPLACEMENT_READINGS, one row per reading, indexed by PointID.
+# Readings are append-only upstream, so each plate is refreshed by fetching only rows
+# newer than the latest Datetime already cached.
+CACHE_DIR = os.environ.get("NL2FUNC_CACHE_DIR", os.path.join("static", "cache"))
+SYNC_INTERVAL = int(os.environ.get("NL2FUNC_READINGS_SYNC_INTERVAL", 300))  # seconds between delta queries per plate
+
+DT_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def to_db_datetime(value):
+    """Normalise a datetime/date/ISO string to the fixed-width text stored in the cache."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.strip())
+    elif isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    return value.strftime(DT_FORMAT)
+
+
+def from_db_datetime(value):
+    if value is None:
+        return None
+    return datetime.strptime(value, DT_FORMAT)
+
+
+class ReadingsCache:
+    """
+    SQLite-backed cache of settlement readings.
+
+    fetch_since(id, since) must return an iterable of (Datetime, Settlement, GroundLevel, Remark)
+    rows for the plate with Datetime strictly greater than `since` (all rows when `since` is None).
+    """
+
+    def __init__(self, path, fetch_since, sync_interval=SYNC_INTERVAL):
+        self.path = path
+        self.fetch_since = fetch_since
+        self.sync_interval = sync_interval
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._ready = False
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._ready:
+            self._create_schema(conn)
+        return conn
+
+    def _create_schema(self, conn):
+        with conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute('''CREATE TABLE IF NOT EXISTS readings (
+                PointID TEXT NOT NULL,
+                Datetime TEXT NOT NULL,
+                Settlement REAL,
+                GroundLevel REAL,
+                Remark TEXT)''')
+            # one row per reading: the app and the snapshot job can sync the same plate from separate
+            # processes, and the plate lock only serialises syncs within one
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_readings_point_dt'").fetchone():
+                conn.execute("DELETE FROM readings WHERE rowid NOT IN "
+                             "(SELECT MIN(rowid) FROM readings GROUP BY PointID, Datetime)")
+                conn.execute("DROP INDEX IF EXISTS idx_readings_point_dt")
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_readings_point_dt_unique ON readings (PointID, Datetime)")
+            conn.execute('''CREATE TABLE IF NOT EXISTS sync_state (
+                PointID TEXT PRIMARY KEY,
+                synced_at REAL NOT NULL)''')
+        self._ready = True
+
+    def _plate_lock(self, id):
+        with self._locks_guard:
+            if id not in self._locks:
+                self._locks[id] = threading.Lock()
+            return self._locks[id]
+
+    def sync(self, id, force=False):
+        """Pull readings newer than the cached maximum Datetime for one plate."""
+        with self._plate_lock(id):
+            conn = self._connect()
+            try:
+                row = conn.execute("SELECT synced_at FROM sync_state WHERE PointID = ?", (id,)).fetchone()
+                if not force and row is not None and time.time() - row[0] < self.sync_interval:
+                    return 0
+
+                latest = conn.execute("SELECT MAX(Datetime) FROM readings WHERE PointID = ?", (id,)).fetchone()[0]
+                rows = self.fetch_since(id, from_db_datetime(latest))
+                new_rows = [(id, to_db_datetime(r[0]), r[1], r[2], r[3]) for r in rows]
+                before = conn.total_changes
+                with conn:
+                    # rows another process synced in the meantime are skipped
+                    conn.executemany("INSERT OR IGNORE INTO readings VALUES (?, ?, ?, ?, ?)", new_rows)
+                    added = conn.total_changes - before
+                    conn.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?)", (id, time.time()))
+                if added:
+                    print(f"[DEBUG][ReadingsCache] {id}: +{added} readings")
+                return added
+            finally:
+                conn.close()
+
+    def readings(self, id, start=None, end=None, settled_only=False):
+        """
+        Returns [(Datetime, Settlement, GroundLevel, Remark), ...] for a plate in ascending Datetime order,
+        optionally bounded by start <= Datetime <= end.
+        """
+        self.sync(id)
+        query = "SELECT Datetime, Settlement, GroundLevel, Remark FROM readings WHERE PointID = ?"
+        args = [id]
+        if start is not None:
+            query += " AND Datetime >= ?"
+            args.append(to_db_datetime(start))
+        if end is not None:
+            query += " AND Datetime <= ?"
+            args.append(to_db_datetime(end))
+        if settled_only:
+            query += " AND Settlement IS NOT NULL"
+        query += " ORDER BY Datetime ASC"
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(query, args).fetchall()
+        finally:
+            conn.close()
+        return [(from_db_datetime(r[0]), r[1], r[2], r[3]) for r in rows]
+
+    def latest_datetime(self, id):
+        """Latest cached reading time for a plate (after syncing), or None."""
+        self.sync(id)
+        conn = self._connect()
+        try:
+            latest = conn.execute("SELECT MAX(Datetime) FROM readings WHERE PointID = ?", (id,)).fetchone()[0]
+        finally:
+            conn.close()
+        return from_db_datetime(latest)
+
+    def latest_datetimes(self, ids, sync=True):
+        """{id: latest cached reading time or None}; with sync=False, only what is already cached."""
+        ids = list(dict.fromkeys(ids))
+        if sync:
+            for id in ids:
+                self.sync(id)
+        latest = dict.fromkeys(ids)
+        conn = self._connect()
+        try:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                query = (f"SELECT PointID, MAX(Datetime) FROM readings WHERE PointID IN ({', '.join('?' * len(chunk))}) "
+                         "GROUP BY PointID")
+                for id, value in conn.execute(query, chunk):
+                    latest[id] = from_db_datetime(value)
+        finally:
+            conn.close()
+        return latest
+
+    def clear(self, id=None):
+        conn = self._connect()
+        try:
+            with conn:
+                if id is None:
+                    conn.execute("DELETE FROM readings")
+                    conn.execute("DELETE FROM sync_state")
+                else:
+                    conn.execute("DELETE FROM readings WHERE PointID = ?", (id,))
+                    conn.execute("DELETE FROM sync_state WHERE PointID = ?", (id,))
+        finally:
+            conn.close()
@@ -0,0 +1,112 @@
+"""
+Warm pool of Plotly/kaleido renderers.
+
+Each worker process starts kaleido's Chromium once and keeps it for the life of the pool, so a report
+pays the browser startup per worker instead of per figure, and many figures render side by side.
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+RENDER_WORKERS = int(os.environ.get("NL2FUNC_RENDER_WORKERS", os.cpu_count() or 1))
+
+_pool = None
+_pool_lock = threading.Lock()
+_in_worker = False
+
+
+def _warm_up():
+    global _in_worker
+    _in_worker = True
+    import plotly.graph_objs as go
+    try:
+        # kaleido >= 1 renders through a browser started per call unless a sync server is running
+        import kaleido
+        kaleido.start_sync_server(silence_warnings=True)
+    except (ImportError, AttributeError, TypeError):
+        pass
+    go.Figure().to_image(format="pdf", width=10, height=10)
+
+
+def _render(fig_json, width, height):
+    import plotly.io as pio
+    return pio.from_json(fig_json).to_image(format="pdf", width=width, height=height)
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=_warm_up)
+        return _pool
+
+
+def shutdown(pool=None):
+    """Stop the pool; with `pool`, only if that is still the current one (not a fresh replacement)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and (pool is None or pool is _pool):
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+atexit.register(shutdown)
+
+
+class RenderTask:
+    """
+    Handle for a task on the render pool. If the pool breaks (a worker died, e.g. Chromium crashed)
+    result() starts a fresh pool for later tasks and runs this one in the calling process instead.
+    """
+
+    def __init__(self, pool, future, fn, args, kwargs):
+        self.pool = pool
+        self.future = future
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+    def result(self, timeout=None):
+        if self.future is not None:
+            try:
+                return self.future.result(timeout)
+            except BrokenProcessPool:
+                shutdown(self.pool)
+                print(f"[Warning] Render pool broke; running {self.fn.__name__} in-process")
+        return self.fn(*self.args, **self.kwargs)
+
+
+def submit(fn, *args, **kwargs):
+    """Run fn on a warm render worker (fn and its arguments must be picklable); returns a RenderTask."""
+    pool = get_pool()
+    try:
+        future = pool.submit(fn, *args, **kwargs)
+    except BrokenProcessPool:
+        shutdown(pool)
+        future = None  # run in-process when the result is asked for
+    return RenderTask(pool, future, fn, args, kwargs)
+
+
+def render_pdfs(figs, width=None, height=None):
+    """Render figures to PDF bytes on the warm pool, returned in the same order as figs."""
+    if _in_worker:
+        # already on a warm worker (e.g. inside a per-plate task): render here
+        return [fig.to_image(format="pdf", width=width, height=height) for fig in figs]
+    payloads = [fig.to_json() for fig in figs]
+    if not payloads:
+        return []
+    pool = get_pool()
+    try:
+        return list(pool.map(_render, payloads, [width] * len(payloads), [height] * len(payloads)))
+    except BrokenProcessPool:
+        # a worker died (e.g. Chromium crashed): start a fresh pool next time and render here for now
+        shutdown(pool)
+        return [fig.to_image(format="pdf", width=width, height=height) for fig in figs]
+
+
+def render_pdf(fig, width=None, height=None):
+    return render_pdfs([fig], width, height)[0]
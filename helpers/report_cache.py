@@ -0,0 +1,163 @@
+"""
+Content-addressed cache of rendered report pages.
+
+An entry is addressed by a hash of (what was rendered, its normalised parameters, the data version
+it was rendered from), so a repeated request with no new readings reuses the stored pages and any
+new reading changes the key instead of needing an explicit invalidation. Entries are
+<key>-<n>.pdf page blobs plus a <key>.json manifest written last, and the directory is kept under
+a byte budget by evicting least recently used entries.
+"""
+import hashlib
+import json
+import os
+import threading
+from datetime import date, datetime
+
+from helpers.readings_cache import CACHE_DIR
+
+REPORT_CACHE_DIR = os.environ.get("NL2FUNC_REPORT_CACHE_DIR", os.path.join(CACHE_DIR, "reports"))
+REPORT_CACHE_MAX_MB = int(os.environ.get("NL2FUNC_REPORT_CACHE_MAX_MB", 512))
+REPORT_FORMAT = 1  # bump when page layout changes so old pages stop matching
+
+
+def normalize(value):
+    """JSON-stable form of report parameters: dates as ISO strings, tuples as lists, strings stripped."""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, dict):
+        return {str(k): normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize(v) for v in value]
+    if hasattr(value, "item"):  # numpy scalars
+        return value.item()
+    return value
+
+
+def cache_key(kind, params, version):
+    """Hex digest for one cacheable artifact, e.g. cache_key("asaoka_plate", {...}, latest_reading)."""
+    payload = json.dumps([REPORT_FORMAT, kind, normalize(params), normalize(version)], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ReportCache:
+    def __init__(self, directory=REPORT_CACHE_DIR, max_bytes=REPORT_CACHE_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def get(self, key):
+        """(page_paths, meta) for a stored entry, or None. Copy the pages out before relying on them for long."""
+        manifest = self._path(key + ".json")
+        try:
+            with open(manifest, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            paths = [self._path(f"{key}-{i}.pdf") for i in range(entry["pages"])]
+            if not all(os.path.exists(p) for p in paths):
+                raise FileNotFoundError(key)
+            os.utime(manifest)  # mark as recently used
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self._counters["misses"] += 1
+            return None
+        with self._lock:
+            self._counters["hits"] += 1
+        return paths, entry.get("meta")
+
+    def put(self, key, pages, meta=None):
+        os.makedirs(self.directory, exist_ok=True)
+        for i, page in enumerate(pages):
+            self._write(f"{key}-{i}.pdf", page)
+        self._write(key + ".json", json.dumps({"pages": len(pages), "meta": normalize(meta)}).encode("utf-8"))
+        with self._lock:
+            self._counters["stores"] += 1
+        self.evict()
+
+    def _write(self, name, data):
+        path = self._path(name)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _entries(self):
+        """{key: [last_used, size, [files]]} for everything in the cache directory."""
+        entries = {}
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            if name.endswith(".tmp"):
+                continue
+            key = name.split("-", 1)[0].split(".", 1)[0]
+            try:
+                st = os.stat(self._path(name))
+            except FileNotFoundError:
+                continue
+            entry = entries.setdefault(key, [0.0, 0, []])
+            if name.endswith(".json"):
+                entry[0] = st.st_mtime
+            entry[1] += st.st_size
+            entry[2].append(name)
+        return entries
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        with self._lock:
+            entries = self._entries()
+            total = sum(e[1] for e in entries.values())
+            if total <= self.max_bytes:
+                return 0
+            evicted = 0
+            # entries without a manifest (interrupted writes) sort first with last_used 0
+            for key, (_, size, names) in sorted(entries.items(), key=lambda kv: kv[1][0]):
+                if total <= self.max_bytes:
+                    break
+                for name in names:
+                    try:
+                        os.remove(self._path(name))
+                    except FileNotFoundError:
+                        pass
+                total -= size
+                evicted += 1
+            self._counters["evictions"] += evicted
+            return evicted
+
+    def clear(self):
+        with self._lock:
+            for names in (e[2] for e in self._entries().values()):
+                for name in names:
+                    try:
+                        os.remove(self._path(name))
+                    except FileNotFoundError:
+                        pass
+
+    def stats(self):
+        with self._lock:
+            c = dict(self._counters)
+        lookups = c["hits"] + c["misses"]
+        c["hit_rate"] = round(c["hits"] / lookups, 3) if lookups else 0.0
+        entries = self._entries()
+        c["entries"] = len(entries)
+        c["bytes"] = sum(e[1] for e in entries.values())
+        return c
+
+
+_report_cache = None
+_report_cache_lock = threading.Lock()
+
+
+def get_report_cache():
+    global _report_cache
+    with _report_cache_lock:
+        if _report_cache is None:
+            _report_cache = ReportCache()
+        return _report_cache
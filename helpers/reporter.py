@@ -9,16 +9,26 @@ from io import BytesIO
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
 from reportlab.lib import colors
-from reportlab.platypus import Table, TableStyle
+from reportlab.platypus import Table, TableStyle, SimpleDocTemplate, Paragraph, Spacer
+from reportlab.lib.styles import ParagraphStyle
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfbase import pdfmetrics
 
 from helpers.asaoka import Asaoka_data
+from helpers.backends import get_datasource
 from helpers.datasources import S_series, SM_metrics
-from helpers.data_structures import merge_pdfs_to_bytes
+from helpers.data_structures import map_plates, PageSpool
+from helpers.renderer import render_pdf, submit
+from helpers.report_cache import cache_key, get_report_cache
 
+PAGE_WIDTH, PAGE_HEIGHT = 800, 1124
+PG1_MARGIN = dict(l=80, r=80, t=100, b=80)  # fixed so the reportlab tables line up with the plot domains
 
-def plot_pg_0(df_overview):
+TABLE_FILL = colors.Color(229 / 255, 236 / 255, 246 / 255)
+TABLE_LINE = colors.HexColor('#506784')
+
+
+def register_fonts():
     if 'OpenSans' not in pdfmetrics.getRegisteredFontNames():
         base_dir = os.getcwd()
         regular_font_path = os.path.join(base_dir, 'static', 'fonts', 'OpenSans-Regular.ttf')
@@ -28,6 +38,27 @@ def plot_pg_0(df_overview):
         pdfmetrics.registerFont(TTFont('OpenSans-Bold', bold_font_path))
 
 
+def info_table(rows, col_widths, header_size=11, cell_size=10, repeat_rows=0):
+    """Light-blue table in the style of the Plotly tables it replaces: bold first row, grid lines."""
+    table = Table(rows, colWidths=col_widths, repeatRows=repeat_rows)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), TABLE_FILL),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('FONTNAME', (0, 0), (-1, 0), 'OpenSans-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), header_size),
+        ('FONTNAME', (0, 1), (-1, -1), 'OpenSans'),
+        ('FONTSIZE', (0, 1), (-1, -1), cell_size),
+        ('TOPPADDING', (0, 0), (-1, -1), 5),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ('GRID', (0, 0), (-1, -1), 0.75, TABLE_LINE),
+    ]))
+    return table
+
+
+def plot_pg_0(df_overview, failures=None):
+    register_fonts()
+
     latest_date = max(pd.to_datetime(df_overview["Last Read"]))
     week = latest_date.isocalendar()[1]
 
@@ -73,6 +104,17 @@ def plot_pg_0(df_overview):
     table_width, table_height = table.wrapOn(c, width, height)
     table.drawOn(c, (width - table_width) / 2, height - table_height - 90)
 
+    if failures:
+        y = height - table_height - 120
+        c.setFont("OpenSans-Bold", 11)
+        c.drawString(50, y, "Plates not included in this report:")
+        c.setFont("OpenSans", 9)
+        for id, reason in failures:
+            y -= 14
+            if y < 40:
+                break
+            c.drawString(60, y, f"{id}: {reason}"[:110])
+
     c.save()
     tmp_pg0.seek(0)
 
@@ -80,55 +122,9 @@ def plot_pg_0(df_overview):
 
 
 
-def plot_pg_1(id, df_S, df_A, table_S, table_A, SCD, ASD, trendline, Y_dtick=500):
+def figure_pg_1(id, df_S, df_A, SCD, ASD, trendline, Y_dtick=500):
     m, b = trendline["m"], trendline["b"]
 
-    table_header_1 = go.Table(
-        domain=dict(x=[0, 1],
-                    y=[0.95, 1.0]),
-        header=dict(height=30,
-                    values=[f'{id} Settlement and ground level Series'],
-                    line=dict(color='rgb(0,0,0)'),
-                    font=dict(color=['rgb(0,0,0)'], size=14),
-                    fill=dict(color='rgba(229, 236, 246, 100)')))
-
-    table_header_2 = go.Table(
-        domain=dict(x=[0, 1],
-                    y=[0.51, 0.56]),
-        header=dict(height=30,
-                    values=[f'{id} Asaoka Plot'],
-                    line=dict(color='rgb(0,0,0)'),
-                    font=dict(color=['rgb(0,0,0)'], size=14),
-                    fill=dict(color='rgba(229, 236, 246, 100)')))
-
-    table_summary = go.Table(
-        domain=dict(x=[0, 1],
-                    y=[0.87, 0.95]),
-        header=dict(height=30,
-                    values=list(table_S.keys()),
-                    line=dict(color='rgb(50, 50, 50)'),
-                    font=dict(color=['rgb(45, 45, 45)'] * 5, size=14),
-                    fill=dict(color='rgba(229, 236, 246, 100)')),
-        cells=dict(values=list(table_S.values()),
-                   line=dict(color='#506784'),
-                   font=dict(color=['rgb(40, 40, 40)'] * 5, size=12),
-                   fill=dict(color='rgba(229, 236, 246, 100)'),
-                   height=30)
-    )
-
-    table_Asaoka = go.Table(
-        domain=dict(x=[0, 1],
-                    y=[0.41, 0.51]),
-        header=dict(values=list(table_A.keys()),
-                    line=dict(color='rgb(50, 50, 50)'),
-                    font=dict(color=['rgb(45, 45, 45)'] * 5, size=14),
-                    fill=dict(color='rgba(229, 236, 246, 100)')),
-        cells=dict(values=list(table_A.values()),
-                   line=dict(color='#506784'),
-                   font=dict(color=['rgb(40, 40, 40)'] * 5, size=12),
-                   fill=dict(color='rgba(229, 236, 246, 100)')
-                   ))
-
     trace_settlement = go.Scatter(
         x=df_S['Date'],
         y=df_S['Settlement (mm)'],
@@ -263,6 +259,7 @@ def plot_pg_1(id, df_S, df_A, table_S, table_A, SCD, ASD, trendline, Y_dtick=500
         width=800,
         height=1200,
         autosize=True,
+        margin=PG1_MARGIN,
         title=f'{id} Asaoka Assessment',
         xaxis1=dict(x_axis, **dict(domain=[0, 1], anchor='y1', dtick="M1", showticklabels=True, title='Date')),
         xaxis2=dict(axis_asaoka, **dict(domain=[0, 1], anchor='y2', title="S<sub>T-1</sub>")),
@@ -275,8 +272,7 @@ def plot_pg_1(id, df_S, df_A, table_S, table_A, SCD, ASD, trendline, Y_dtick=500
     )
 
     fig_gen = dict(
-        data=[table_header_1, table_header_2, trace_settlement, trace_GL, trace_ASD, trace_SCD, table_summary,
-              trace_Asaoka, trace_int, trace_fit, table_Asaoka], layout=layout)
+        data=[trace_settlement, trace_GL, trace_ASD, trace_SCD, trace_Asaoka, trace_int, trace_fit], layout=layout)
 
     fig = go.Figure(fig_gen)
     fig.update_layout(legend=dict(
@@ -287,133 +283,228 @@ def plot_pg_1(id, df_S, df_A, table_S, table_A, SCD, ASD, trendline, Y_dtick=500
         x=0
     ))
 
-    pg1 = fig.to_image(format="pdf", width=800, height=1124)
-    return pg1
+    return fig
 
 
-def plot_pg_2(id, df_plot):
-    dp_limit = ''
-    if len(df_plot) > 30:
-        df_plot = df_plot.tail(30)
-        dp_limit = ' (Showing latest 30 datapoints)'
-    table_header = go.Table(
-        domain=dict(x=[0, 1],
-                    y=[0.95, 1.0]),
-        header=dict(height=30,
-                    values=[f'{id} Asaoka Ordered Pairs{dp_limit}'],
-                    line=dict(color='rgb(255,255,255)'),
-                    font=dict(color=['rgb(0,0,0)'], size=14),
-                    fill=dict(color='rgba(229, 236, 246, 100)')))
-
-    table_pairs = go.Table(
-        domain=dict(x=[0, 1],
-                    y=[0, 0.95]),
-        header=dict(height=30,
-                    values=["T", "St", "T-1", "St-1"],
-                    line=dict(color='rgb(50, 50, 50)'),
-                    font=dict(color=['rgb(45, 45, 45)'] * 5, size=14),
-                    fill=dict(color='rgba(229, 236, 246, 100)')),
-        cells=dict(values=list(df_plot[i] for i in ["T", "St", "T-1", "St-1"]),
-                   line=dict(color='#506784'),
-                   font=dict(color=['rgb(40, 40, 40)'] * 5, size=12),
-                   fill=dict(color='rgba(229, 236, 246, 100)'),
-                   height=30)
-    )
+def overlay_pg_1(pg1, id, table_S, table_A):
+    """
+    Draws page 1's title bars and info tables with reportlab and stamps them onto the rendered
+    chart page, in the blank bands the chart layout leaves for them.
+    """
+    register_fonts()
+    page = PyPDF2.PdfReader(BytesIO(pg1)).pages[0]
+    width, height = float(page.mediabox.width), float(page.mediabox.height)
+    scale = width / PAGE_WIDTH
+    left = PG1_MARGIN["l"] * scale
+    table_width = (PAGE_WIDTH - PG1_MARGIN["l"] - PG1_MARGIN["r"]) * scale
+    plot_height = PAGE_HEIGHT - PG1_MARGIN["t"] - PG1_MARGIN["b"]
 
-    layout = dict(
-        width=800,
-        height=1200,
-        autosize=True,
-        plot_bgcolor='rgba(229, 236, 246, 100)'
-    )
+    def top(y_domain):
+        return (PG1_MARGIN["b"] + y_domain * plot_height) * scale
+
+    def columns(n):
+        return [table_width / n] * n
+
+    blocks = [
+        (1.0, info_table([[f'{id} Settlement and ground level Series']], columns(1), header_size=12)),
+        (0.95, info_table([list(table_S.keys()), [str(v) for v in table_S.values()]], columns(len(table_S)))),
+        (0.56, info_table([[f'{id} Asaoka Plot']], columns(1), header_size=12)),
+        (0.51, info_table([list(table_A.keys()), [str(v) for v in table_A.values()]], columns(len(table_A)))),
+    ]
+
+    tmp = BytesIO()
+    c = canvas.Canvas(tmp, pagesize=(width, height))
+    for y_domain, table in blocks:
+        _, table_height = table.wrapOn(c, table_width, height)
+        table.drawOn(c, left, top(y_domain) - table_height)
+    c.save()
+    tmp.seek(0)
+
+    page.merge_page(PyPDF2.PdfReader(tmp).pages[0])
+    writer = PyPDF2.PdfWriter()
+    writer.add_page(page)
+    out = BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def plot_pg_1(id, df_S, df_A, table_S, table_A, SCD, ASD, trendline, Y_dtick=500):
+    fig = figure_pg_1(id, df_S, df_A, SCD, ASD, trendline, Y_dtick)
+    return overlay_pg_1(render_pdf(fig, width=PAGE_WIDTH, height=PAGE_HEIGHT), id, table_S, table_A)
 
-    fig_gen = dict(data=[table_header, table_pairs], layout=layout)
-    fig = go.Figure(fig_gen)
-    fig.update_layout(legend=dict(
-        orientation="h",
-        yanchor="top",
-        y=0.63,
-        xanchor="left",
-        x=0
-    ))
 
-    pg2 = fig.to_image(format="pdf", width=800, height=1124)
-    return pg2
+def _pair_cell(value):
+    if isinstance(value, (datetime, pd.Timestamp)):
+        return value.strftime("%Y-%m-%d")
+    if isinstance(value, (float, np.floating)):
+        return f"{value:.2f}"
+    return str(value)[:10] if isinstance(value, str) else str(value)
 
 
-def reporter_Asaoka(ids, SCD: str, ASD: str, max_date, n=4, asaoka_days=7, dtick=500):
-    df_settlement = S_series(ids, max_date)
+def plot_pg_2(id, df_plot):
+    """Asaoka ordered pairs as a reportlab table; long lists continue onto further pages."""
+    register_fonts()
+    columns = ["T", "St", "T-1", "St-1"]
+    rows = [columns] + [[_pair_cell(v) for v in row] for row in df_plot[columns].itertuples(index=False)]
+
+    table = info_table(rows, [120] * len(columns), header_size=12, cell_size=10, repeat_rows=1)
+    title = Paragraph(f'{id} Asaoka Ordered Pairs ({len(df_plot)} datapoints)',
+                      ParagraphStyle('title', fontName='OpenSans-Bold', fontSize=14, leading=18))
+
     tmp = BytesIO()
-    merger = PyPDF2.PdfMerger(fileobj=tmp)
+    doc = SimpleDocTemplate(tmp, pagesize=A4, topMargin=40, bottomMargin=40, title=f'{id} Asaoka Ordered Pairs')
+    doc.build([title, Spacer(1, 12), table])
+    return tmp.getvalue()
+
+
+def plate_pages(id, asaoka_results, SM_data, df, SCD, ASD, dtick=500):
+    """
+    Builds and renders one plate's two pages. Runs on a render worker, so everything it
+    receives and returns is picklable: ([pg1, pg2] PDF bytes, summary row for page 0).
+    """
+    series = asaoka_results["pairs"]
+    dates = asaoka_results["dates"]
+    df_Asaoka = pd.DataFrame(series, columns=['St-1', 'St'])
+    df_Asaoka[["T-1", "T"]] = dates
+
+    m = round(asaoka_results["m"], 3)
+    b = round(asaoka_results["b"], 2)
+    sf = asaoka_results["Asaoka_pred"]
+    equation = f"y = {m}x + {b}"
+    DOC = min(round(asaoka_results["DOC"], 2), 100)
+    latest_date = asaoka_results["Latest_date"]
+
+    DOC_row = [id, str(str(latest_date)[:10]), str(round(SM_data["Final_S"],2)), str(round(SM_data["GL"], 2)), DOC]
+
+    table_S = {
+        "Easting": SM_data["Easting"],
+        "Northing": SM_data["Northing"],
+        "Latest Reading": str(round(SM_data["Final_S"], 3)) + ' m',
+        "Ground Level": str(round(SM_data["GL"], 2)) + ' mCD',
+        "DOC": str(DOC) + ' %'
+    }
+
+    table_Asaoka = {
+        "Equation": str(equation),
+        "Asaoka sf (m)": str(sf),
+        "DOC (%)": str(DOC),
+        "Assessment From": str(str(ASD)[:10])
+    }
+
+    trendline = {"m": m,
+                 "b": b}
+
+    pg1 = plot_pg_1(id, df, df_Asaoka, table_S, table_Asaoka, SCD, ASD, trendline, dtick)
+    pg2 = plot_pg_2(id, df_Asaoka)
+    return [pg1, pg2], DOC_row
+
+
+def reporter_Asaoka(ids, SCD: str, ASD: str, max_date, n=4, asaoka_days=7, dtick=500, out=None, progress=None):
+    """
+    Builds the Asaoka report. Pages are spooled to disk as they are produced and merged straight
+    into `out` (a path or writable file object), which is returned; with out=None the PDF is
+    returned as bytes. Returns None if no plate could be reported.
+    progress(done, total, message) is called as each plate is finished and once for the summary page.
+    """
+    total = len(ids) + 1
+    done = 0
+
+    def step(message):
+        nonlocal done
+        done += 1
+        if progress is not None:
+            progress(done, total, message)
 
     period = 0
-    DOC_lst = []
+    failures = []  # [(id, reason)] for plates left out of the report
 
     # SCD = datetime.strptime(SCD, "%Y-%m-%d")
     # ASD = datetime.strptime(ASD, "%Y-%m-%d")
 
-    for id in ids:
-        try:
-            asaoka_results = Asaoka_data(id, SCD, ASD, max_date, asaoka_days, period, n)
+    # a plate's pages only change when its parameters or readings do, so reuse them from the report cache
+    report_cache = get_report_cache()
+    readings = get_datasource().cache
+    params = dict(SCD=SCD, ASD=ASD, max_date=max_date, n=n, asaoka_days=asaoka_days, period=period, dtick=dtick)
+    # sync the plates concurrently, then read every plate's latest reading time in one query
+    map_plates(readings.sync, ids)
+    versions = readings.latest_datetimes(ids, sync=False)
+    keys = {id: cache_key("asaoka_plate", dict(params, id=id), versions[id]) for id in ids}
+
+    with PageSpool() as spool:
+        plates = {}  # id -> ([spooled page paths], DOC_row)
+        for id in ids:
+            cached = report_cache.get(keys[id])
+            if cached is not None:
+                paths, DOC_row = cached
+                plates[id] = ([spool.add_file(p) for p in paths], DOC_row)
+                step(f"{id} (cached)")
+        todo = [id for id in ids if id not in plates]
+        if progress is not None:
+            progress(done, total, f"Assessing {len(todo)} plates")
+
+        # assessments and metrics are I/O-bound, so fetch them for all plates concurrently up front
+        fetched = map_plates(lambda id: (Asaoka_data(id, SCD, ASD, max_date, asaoka_days, period, n), SM_metrics(id)), todo)
+        df_settlement = S_series(todo, max_date) if todo else None
+
+        # page building and rendering is CPU-bound: one task per plate on the render process pool
+        jobs = []
+        for id, result in zip(todo, fetched):
+            if isinstance(result, Exception):
+                failures.append((id, f"{type(result).__name__}: {result}"))
+                step(f"{id} failed")
+                continue
+            asaoka_results, SM_data = result
             pprint.pp(asaoka_results)
-            SM_data = SM_metrics(id)
+            if asaoka_results.get("Errors"):
+                failures.append((id, str(asaoka_results["Errors"])))
+                step(f"{id} failed")
+                continue
+            if SM_data is None:
+                failures.append((id, "No SM metrics available"))
+                step(f"{id} failed")
+                continue
             df = df_settlement[df_settlement["id"] == id]
-
-            series = asaoka_results["pairs"]
-            dates = asaoka_results["dates"]
-            df_Asaoka = pd.DataFrame(series, columns=['St-1', 'St'])
-            df_Asaoka[["T-1", "T"]] = dates
-
-            m = round(asaoka_results["m"], 3)
-            b = round(asaoka_results["b"], 2)
-            sf = asaoka_results["Asaoka_pred"]
-            equation = f"y = {m}x + {b}"
-            DOC = min(round(asaoka_results["DOC"], 2), 100)
-            latest_date = asaoka_results["Latest_date"]
-            latest_GL = asaoka_results["Latest_GL"]
-
-            DOC_lst.append([id, str(str(latest_date)[:10]), str(round(SM_data["Final_S"],2)), str(round(SM_data["GL"], 2)), DOC])
-
-            table_S = {
-                "Easting": SM_data["Easting"],
-                "Northing": SM_data["Northing"],
-                "Latest Reading": str(round(SM_data["Final_S"], 3)) + ' m',
-                "Ground Level": str(round(SM_data["GL"], 2)) + ' mCD',
-                "DOC": str(DOC) + ' %'
-            }
-
-            table_Asaoka = {
-                "Equation": str(equation),
-                "Asaoka sf (m)": str(sf),
-                "DOC (%)": str(DOC),
-                "Assessment From": str(str(ASD)[:10])
-            }
-
-            trendline = {"m": m,
-                         "b": b}
-
-            pg1 = plot_pg_1(id, df, df_Asaoka, table_S, table_Asaoka, SCD, ASD, trendline, dtick)
-            pg2 = plot_pg_2(id, df_Asaoka)
-
-            merger.append(PyPDF2.PdfReader(BytesIO(pg1)))
-            merger.append(PyPDF2.PdfReader(BytesIO(pg2)))
-
-        except:
+            jobs.append((id, submit(plate_pages, id, asaoka_results, SM_data, df, SCD, ASD, dtick)))
+
+        while jobs:
+            # drop each task once spooled so its page bytes can be freed before the next plate
+            id, job = jobs.pop(0)
+            try:
+                pages, DOC_row = job.result()  # falls back to rendering here if the pool broke
+            except Exception as e:
+                failures.append((id, f"{type(e).__name__}: {e}"))
+                step(f"{id} failed")
+                continue
+            report_cache.put(keys[id], pages, DOC_row)
+            plates[id] = ([spool.add(pg) for pg in pages], DOC_row)
+            del pages, job
+            step(f"{id} rendered")
+
+        for id, reason in failures:
+            print(f"[Warning] Report for {id} cannot be generated. ({reason})")
+        if not plates:
             return None
 
-        # except KeyError:
-        #    return {"result": f"Report for {id} cannot be generated. (Unspecified SCD)"}
-        # except TypeError:
-        #     return {f"Report for {id} cannot be generated. (Invalid SCD)"}
-        # except ZeroDivisionError:
-        #     return {f"Report for {id} cannot be generated. (Missing data. Check SCD)"}
+        ordered = [id for id in ids if id in plates]
+        DOC_lst = [plates[id][1] for id in ordered]
+        page_paths = [path for id in ordered for path in plates[id][0]]
 
-    DOC_df = pd.DataFrame(DOC_lst, columns=["Settlement Plate", "Last Read", "Latest Settlement (m)",
-    "Latest GL (mCD)", "DOC (%)"])
+        # the summary page depends on every plate in the report
+        summary_key = cache_key("asaoka_summary", dict(params, ids=list(ids), failures=failures),
+                                [versions[id] for id in ids])
+        summary = report_cache.get(summary_key)
+        if summary is not None:
+            page_paths.append(spool.add_file(summary[0][0]))
+        else:
+            DOC_df = pd.DataFrame(DOC_lst, columns=["Settlement Plate", "Last Read", "Latest Settlement (m)",
+            "Latest GL (mCD)", "DOC (%)"])
 
-    DOC_df["Remarks"] = np.where(DOC_df["DOC (%)"] > 90, "OK", "Not OK")
+            DOC_df["Remarks"] = np.where(DOC_df["DOC (%)"] > 90, "OK", "Not OK")
 
-    pg0 = plot_pg_0(DOC_df)
-    merger.append(PyPDF2.PdfReader(pg0))
+            pg0 = plot_pg_0(DOC_df, failures).getvalue()
+            report_cache.put(summary_key, [pg0])
+            page_paths.append(spool.add(pg0))
+        step("Summary page")
 
-    return merge_pdfs_to_bytes(merger)
+        print(f"[DEBUG][ReportCache] {len(ids) - len(todo)}/{len(ids)} plates from cache, {report_cache.stats()}")
+        return spool.write(page_paths, out)
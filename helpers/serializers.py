@@ -0,0 +1,87 @@
+"""
+Compact tables of function results for the LLM prompt.
+
+Func1/Func4 used to pass the Python repr of their result dicts (datetimes, numpy floats, every
+Asaoka pair) to the model. These helpers render one row per plate with only the fields the
+function's FUNCTION_GUIDELINES ask the model to report, rounded, as a markdown or CSV table.
+"""
+import math
+import os
+from datetime import date
+
+TABLE_FORMAT = os.environ.get("NL2FUNC_TABLE_FORMAT", "markdown")  # "markdown" or "csv"
+
+# (column shown to the model, key in the result dict, rounding: digits, "date" or None)
+TABLE_COLUMNS = {
+    "Asaoka_data": [
+        ("PointID", "PointID", None),
+        ("latest_Settlement", "Latest_Settlement", 3),
+        ("Latest_GL", "Latest_GL", 2),
+        ("Latest_Date", "Latest_date", "date"),
+        ("DOC", "DOC", 1),
+        ("Asaoka_pred", "Asaoka_pred", 3),
+    ],
+    "SM_overview": [
+        ("PointID", "PointID", None),
+        ("latest_Settlement", "latest_Settlement", 3),
+        ("Latest_GL", "Latest_GL", 2),
+        ("Latest_Date", "Latest_Date", "date"),
+        ("Asaoka_DOC", "Asaoka_DOC", 1),
+        ("Holding_period", "Holding_period", 0),
+        ("7day_rate", "7day_rate", 1),
+    ],
+}
+
+
+def format_value(value, rounding=None):
+    if value is None:
+        return "-"
+    if rounding == "date":
+        return value.strftime("%Y-%m-%d") if isinstance(value, date) else str(value)[:10]
+    if isinstance(rounding, int) and not isinstance(value, str):
+        try:
+            number = float(value)  # also numpy scalars
+        except (TypeError, ValueError):
+            return str(value)
+        if math.isnan(number):
+            return "-"
+        return str(int(round(number))) if rounding == 0 else f"{number:.{rounding}f}"
+    return str(value)
+
+
+def table_rows(func_name, data):
+    """Header and formatted rows for a result dict or list of dicts. Adds an Errors column only when a plate has one."""
+    records = data if isinstance(data, (list, tuple)) else [data]
+    records = [r for r in records if isinstance(r, dict)]
+    columns = TABLE_COLUMNS[func_name]
+    with_errors = any(r.get("Errors") for r in records)
+    header = [c[0] for c in columns] + (["Errors"] if with_errors else [])
+    rows = []
+    for r in records:
+        row = [format_value(r.get(key), rounding) for _, key, rounding in columns]
+        if with_errors:
+            row.append(str(r.get("Errors") or "-"))
+        rows.append(row)
+    return header, rows
+
+
+def to_markdown(header, rows):
+    lines = ["|" + "|".join(header) + "|", "|" + "|".join("---" for _ in header) + "|"]
+    lines += ["|" + "|".join(cell.replace("|", "/") for cell in row) + "|" for row in rows]
+    return "\n".join(lines)
+
+
+def to_csv(header, rows):
+    def cell(value):
+        return f'"{value}"' if "," in value or '"' in value else value
+    return "\n".join(",".join(cell(v) for v in line) for line in [header] + rows)
+
+
+def serialize_results(func_name, data, fmt=None):
+    """Table of `data` for the model; falls back to str(data) for results it has no columns for."""
+    if func_name not in TABLE_COLUMNS or not data:
+        return str(data)
+    header, rows = table_rows(func_name, data)
+    if not rows:
+        return str(data)
+    return to_csv(header, rows) if (fmt or TABLE_FORMAT) == "csv" else to_markdown(header, rows)
@@ -1,12 +1,16 @@
+import os
 import plotly.graph_objs as go
-import PyPDF2
-from io import BytesIO
 import pandas as pd
 from datetime import timedelta
 from helpers.datasources import S_series
-from helpers.data_structures import merge_pdfs_to_bytes
+from helpers.data_structures import PageSpool, downsample_series
+from helpers.renderer import render_pdf
 
-def plot_combi_S(ids, df_S, Y_dtick=500):
+PLOT_MAX_POINTS = int(os.environ.get("NL2FUNC_PLOT_MAX_POINTS", 400))  # per trace; 0 plots every reading
+
+def figure_combi_S(ids, df_S, Y_dtick=500, max_points=None):
+    if max_points is None:
+        max_points = PLOT_MAX_POINTS
     colours = ['rgba(255, 0, 0, 1)', 'rgba(0, 0, 255, 1)', 'rgba(0, 255, 0, 1)', 'rgba(255, 255, 0, 1)',
                'rgba(128, 0, 128, 1)', 'rgba(255, 165, 0, 1)', 'rgba(255, 192, 203, 1)', 'rgba(0, 128, 128, 1)',
                'rgba(0, 255, 150, 1)', 'rgba(0, 255, 255, 1)', 'rgba(255, 0, 255, 1)', 'rgba(75, 0, 130, 1)',
@@ -24,16 +28,24 @@ def plot_combi_S(ids, df_S, Y_dtick=500):
     start_date = min(df_S["Date"])
     end_date = max(df_S["Date"]) + + timedelta(days=15)
 
+    # one pass over the readings instead of two boolean filters per plate
+    groups = {id_value: g for id_value, g in df_S.groupby('id', sort=False)}
+
     traces = []
     for i, id_value in enumerate(ids):
+        g = groups.get(id_value)
+        x, y = ([], []) if g is None else (g['Date'], g['Settlement (mm)'])
+        if len(y) > max_points > 0:
+            keep = downsample_series(pd.to_datetime(x).values.astype('int64'), y, max_points)
+            x, y = x.iloc[keep], y.iloc[keep]
         trace_settlement = go.Scatter(
-            x=df_S[df_S['id'] == id_value]['Date'],
-            y=df_S[df_S['id'] == id_value]['Settlement (mm)'],
+            x=x,
+            y=y,
             xaxis='x1',
             yaxis='y1',
             name=id_value,
             mode='lines+markers',
-            line=dict(width=2, color=colours[i], dash="solid"),
+            line=dict(width=2, color=colours[i % len(colours)], dash="solid"),
             connectgaps=False,
             legendgroup="l1",
             showlegend=True
@@ -91,21 +103,21 @@ def plot_combi_S(ids, df_S, Y_dtick=500):
         x=0,
     ))
     # fig.show()
-    pg1 = fig.to_image(format="pdf")
-    return pg1
+    return fig
+
+def plot_combi_S(ids, df_S, Y_dtick=500, max_points=None):
+    return render_pdf(figure_combi_S(ids, df_S, Y_dtick, max_points))
 
 def y_tick_interval(value, multiple):
     return value - (value % multiple)
 
-def reporter_Settlement(ids, max_date, Y_dtick=None):
+def reporter_Settlement(ids, max_date, Y_dtick=None, out=None, progress=None):
     df_settlement = S_series(ids, max_date)
     if Y_dtick is None:
         Y_dtick = y_tick_interval(abs(max(df_settlement["Settlement (mm)"])), 25)
 
-    tmp = BytesIO()
-
-    merger = PyPDF2.PdfMerger(fileobj=tmp)
-    pg1 = plot_combi_S(ids, df_settlement, Y_dtick)
-    merger.append(PyPDF2.PdfReader(BytesIO(pg1)))
-
-    return merge_pdfs_to_bytes(merger)
+    with PageSpool() as spool:
+        pg1 = spool.add(plot_combi_S(ids, df_settlement, Y_dtick))
+        if progress is not None:
+            progress(1, 1, "Settlement plot")
+        return spool.write([pg1], out)
@@ -0,0 +1,214 @@
+"""
+Precomputed per-plate site snapshot.
+
+Built nightly (or after each readings upload) with
+
+    python -m helpers.snapshot
+
+and read by Func1/Func4, which answer from it while it is fresh and fall back to live queries otherwise.
+Fresh means younger than SNAPSHOT_MAX_AGE and built from the latest readings: each row keeps the
+time of the plate's latest reading, and a plate with newer readings in the datasource (checked with
+one batched query per request) makes the snapshot stale for any request that includes it.
+"""
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+from helpers.asaoka import Asaoka_data
+from helpers.backends import get_datasource
+from helpers.datasources import plate_context
+from helpers.data_structures import map_plates, PLATE_WORKERS
+from helpers.readings_cache import CACHE_DIR, to_db_datetime, from_db_datetime
+
+SNAPSHOT_PATH = os.environ.get("NL2FUNC_SNAPSHOT", os.path.join(CACHE_DIR, "snapshot.sqlite"))
+SNAPSHOT_MAX_AGE = int(os.environ.get("NL2FUNC_SNAPSHOT_MAX_AGE", 24 * 3600))  # seconds
+
+COLUMNS = ["PointID", "SCD", "ASD", "Latest_Settlement", "Latest_GL", "Latest_Date", "Holding_period",
+           "Rate_7day", "Asaoka_DOC", "Asaoka_pred", "R2_score", "Errors", "Latest_Reading"]
+
+
+def _day(value):
+    return str(value)[:10] if value is not None else None
+
+
+def _number(value, digits):
+    return round(float(value), digits) if value is not None else None
+
+
+def compute_plate(id):
+    """Snapshot row for one plate, assessed with its SettlementPlates SCD/ASD up to now."""
+    # past the sync throttle, so the row (and its Latest_Reading) covers every upstream reading
+    get_datasource().cache.sync(id, force=True)
+    readings = plate_context(id)
+    latest = readings.latest()
+    asaoka = Asaoka_data(id, None, None)
+    SCD = asaoka["SCD"]
+    return {"PointID": id,
+            "SCD": _day(SCD),
+            "ASD": _day(asaoka["ASD"]),
+            "Latest_Settlement": _number(latest[1] * 0.001, 4) if latest else None,
+            "Latest_GL": _number(latest[2], 3) if latest else None,
+            "Latest_Date": _day(latest[0]) if latest else None,
+            "Holding_period": (latest[0] - SCD).days if latest and SCD else None,
+            "Rate_7day": _number(readings.settlement_rate(7), 1),
+            "Asaoka_DOC": _number(asaoka["DOC"], 2),
+            "Asaoka_pred": _number(asaoka["Asaoka_pred"], 3),
+            "R2_score": _number(asaoka["R2_score"], 2),
+            "Errors": str(asaoka["Errors"]) if asaoka["Errors"] else None,
+            # readings version the row was computed from (any reading, with or without a settlement value)
+            "Latest_Reading": to_db_datetime(readings.rows[-1][0]) if readings.rows else None}
+
+
+def _connect(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def build_snapshot(ids=None, path=SNAPSHOT_PATH, max_workers=PLATE_WORKERS):
+    """
+    Recompute every plate and replace the snapshot table in one transaction. Passing `ids`
+    refreshes just those rows and leaves the snapshot's build time alone.
+    """
+    t0 = time.perf_counter()
+    full = ids is None
+    if full:
+        ids = get_datasource().plate_ids()
+    results = map_plates(compute_plate, ids, max_workers)
+    rows = []
+    for id, result in zip(ids, results):
+        if isinstance(result, Exception):
+            error = f"{type(result).__name__}: {result}"
+            result = dict.fromkeys(COLUMNS)
+            result.update(PointID=id, Errors=error)
+        rows.append([result[c] for c in COLUMNS])
+
+    conn = _connect(path)
+    try:
+        with conn:
+            existing = [r[1] for r in conn.execute("PRAGMA table_info(plate_snapshot)")]
+            if existing and existing != COLUMNS:
+                # built by an older version with other columns: start over
+                conn.execute("DROP TABLE plate_snapshot")
+            conn.execute(f"CREATE TABLE IF NOT EXISTS plate_snapshot (PointID TEXT PRIMARY KEY, {', '.join(COLUMNS[1:])})")
+            conn.execute("CREATE TABLE IF NOT EXISTS snapshot_meta (key TEXT PRIMARY KEY, value TEXT)")
+            if full:
+                conn.execute("DELETE FROM plate_snapshot")
+            conn.executemany(f"INSERT OR REPLACE INTO plate_snapshot VALUES ({', '.join('?' * len(COLUMNS))})", rows)
+            if full:
+                conn.execute("INSERT OR REPLACE INTO snapshot_meta VALUES ('built_at', ?)", (str(time.time()),))
+    finally:
+        conn.close()
+    print(f"[DEBUG][Snapshot] {len(rows)} plates in {time.perf_counter() - t0:.1f} s -> {path}")
+    return len(rows)
+
+
+def snapshot_age(path=SNAPSHOT_PATH):
+    """Seconds since the snapshot was built, or None if there is none."""
+    if not os.path.exists(path):
+        return None
+    conn = _connect(path)
+    try:
+        row = conn.execute("SELECT value FROM snapshot_meta WHERE key = 'built_at'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+    return time.time() - float(row[0]) if row else None
+
+
+def newer_readings(rows):
+    """PointIDs whose latest reading in the datasource is newer than the one their snapshot row was built from."""
+    latest = get_datasource().latest_readings([r["PointID"] for r in rows])
+    stale = []
+    for r in rows:
+        built = from_db_datetime(r.get("Latest_Reading"))
+        live = latest.get(r["PointID"])
+        if live is not None and (built is None or live > built):
+            stale.append(r["PointID"])
+    return stale
+
+
+def load_snapshot(ids, max_age=SNAPSHOT_MAX_AGE, path=SNAPSHOT_PATH):
+    """
+    Snapshot rows for ids in order, or None if the snapshot is too old, missing any of the plates,
+    or any of them has readings newer than its row.
+    """
+    age = snapshot_age(path)
+    if age is None or age > max_age:
+        return None
+    ids = list(ids)
+    found = {}
+    conn = _connect(path)
+    try:
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            query = f"SELECT * FROM plate_snapshot WHERE PointID IN ({', '.join('?' * len(chunk))})"
+            for row in conn.execute(query, chunk):
+                found[row["PointID"]] = dict(row)
+    finally:
+        conn.close()
+    if len(found) != len(set(ids)):
+        return None
+    stale = newer_readings(list(found.values()))
+    if stale:
+        print(f"[DEBUG][Snapshot] {len(stale)} of {len(found)} plates have newer readings, answering live")
+        return None
+    return [found[id] for id in ids]
+
+
+def overview_from_snapshot(ids, max_age=SNAPSHOT_MAX_AGE):
+    """SM_overview-shaped rows from the snapshot, or None to fall back to a live overview."""
+    rows = load_snapshot(ids, max_age)
+    if rows is None:
+        return None
+    return [{"PointID": r["PointID"],
+             "latest_Settlement": r["Latest_Settlement"],
+             "Latest_GL": r["Latest_GL"],
+             "Latest_Date": r["Latest_Date"],
+             "Asaoka_DOC": r["Asaoka_DOC"],
+             "Surcharge_Complete_Date": r["SCD"],
+             "Holding_period": r["Holding_period"],
+             "7day_rate": r["Rate_7day"]} for r in rows]
+
+
+def asaoka_from_snapshot(id, SCD=None, ASD=None, max_age=SNAPSHOT_MAX_AGE):
+    """
+    Asaoka_data-shaped summary (without pairs) from the snapshot. Only used when the requested
+    SCD/ASD are the plate's own dates, which is what the snapshot was assessed with.
+    """
+    data = asaoka_batch_from_snapshot([id], SCD, ASD, max_age)
+    return data[0] if data is not None else None
+
+
+def asaoka_batch_from_snapshot(ids, SCD=None, ASD=None, max_age=SNAPSHOT_MAX_AGE):
+    """asaoka_from_snapshot for several plates with one snapshot load; None unless every plate can be answered."""
+    rows = load_snapshot(ids, max_age)
+    if rows is None:
+        return None
+    if any(SCD not in (None, r["SCD"]) or ASD not in (None, r["ASD"]) for r in rows):
+        return None
+    return [{"PointID": r["PointID"],
+             "SCD": r["SCD"],
+             "ASD": r["ASD"],
+             "R2_score": r["R2_score"],
+             "Asaoka_pred": r["Asaoka_pred"],
+             "DOC": r["Asaoka_DOC"],
+             "Latest_Settlement": r["Latest_Settlement"],
+             "Latest_GL": r["Latest_GL"],
+             "Latest_date": r["Latest_Date"],
+             "Errors": r["Errors"]} for r in rows]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the precomputed plate snapshot")
+    parser.add_argument("--out", default=SNAPSHOT_PATH)
+    parser.add_argument("--workers", type=int, default=PLATE_WORKERS)
+    args = parser.parse_args()
+    build_snapshot(path=args.out, max_workers=args.workers)
+    print(f"Snapshot built at {datetime.now():%Y-%m-%d %H:%M}")
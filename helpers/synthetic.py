@@ -0,0 +1,107 @@
+"""
+Synthetic settlement plate site for offline profiling.
+
+    python -m helpers.synthetic --plates 1900 --out static/cache/synthetic.sqlite
+    NL2FUNC_DATASOURCE=sqlite:static/cache/synthetic.sqlite streamlit run app.py
+"""
+import argparse
+import math
+import os
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+from helpers.readings_cache import to_db_datetime
+
+PLATES_PER_REGION = 26
+REGION_LETTERS = "abcd"
+
+
+def plate_id(index):
+    """F3-R01a-SM-01, ..., F3-R01a-SM-26, F3-R01b-SM-01, ..."""
+    sub, num = divmod(index, PLATES_PER_REGION)
+    region, letter = divmod(sub, len(REGION_LETTERS))
+    return f"F3-R{region + 1:02d}{REGION_LETTERS[letter]}-SM-{num + 1:02d}"
+
+
+def plate_curve(rng, start, days):
+    """
+    One plate's daily readings: a fill ramp up to surcharge level, then primary consolidation
+    S(t) = S_ult * (1 - exp(-t / tau)) with reading noise, missed readings and (for some plates)
+    surcharge removal, which shows up as a >2.5 m drop in ground level.
+    """
+    fill_start = start + timedelta(days=rng.randint(0, 120))
+    fill_days = rng.randint(30, 60)
+    SCD = fill_start + timedelta(days=fill_days)
+    ASD = SCD + timedelta(days=rng.randint(14, 28))
+
+    base_GL = rng.uniform(9.0, 11.0)
+    surcharge = rng.uniform(7.5, 10.0)
+    S_ult = rng.uniform(800, 2500)           # mm
+    tau = rng.uniform(60, 200)               # days
+    removal = SCD + timedelta(days=rng.randint(150, 300)) if rng.random() < 0.3 else None
+
+    rows = []
+    end = start + timedelta(days=days)
+    day = fill_start
+    while day <= end:
+        if rng.random() < 0.05:              # missed reading
+            day += timedelta(days=1)
+            continue
+        t = (day - fill_start).days
+        load = min(t / fill_days, 1.0)
+        settlement = -S_ult * load * (1 - math.exp(-t / tau)) + rng.gauss(0, 2.0)
+        GL = base_GL + surcharge * load + settlement / 1000
+        if removal is not None and day >= removal:
+            GL -= surcharge * 0.4
+        rows.append((day, round(settlement, 1), round(GL, 3), None))
+        day += timedelta(days=1)
+    return SCD, ASD, rows
+
+
+def generate_site(path, plates=1900, days=540, start=datetime(2024, 1, 1), seed=0):
+    rng = random.Random(seed)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)
+
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute('''CREATE TABLE SettlementPlates (
+            PointID TEXT PRIMARY KEY,
+            Surcharge_complete_date TEXT,
+            Asaoka_Start_Date TEXT,
+            Easting REAL,
+            Northing REAL)''')
+        conn.execute('''CREATE TABLE MON_DISPLACEMENT_READINGS (
+            PointID TEXT NOT NULL,
+            Datetime TEXT NOT NULL,
+            Settlement REAL,
+            GroundLevel REAL,
+            Remark TEXT)''')
+        for i in range(plates):
+            id = plate_id(i)
+            SCD, ASD, rows = plate_curve(rng, start, days)
+            # plates laid out on a 40 m grid (one per 1600 sqm)
+            easting, northing = 20000 + 40 * (i % 100), 30000 + 40 * (i // 100)
+            conn.execute("INSERT INTO SettlementPlates VALUES (?, ?, ?, ?, ?)",
+                         (id, SCD.strftime("%Y-%m-%d"), ASD.strftime("%Y-%m-%d"), easting, northing))
+            conn.executemany("INSERT INTO MON_DISPLACEMENT_READINGS VALUES (?, ?, ?, ?, ?)",
+                             [(id, to_db_datetime(r[0]), r[1], r[2], r[3]) for r in rows])
+        conn.execute("CREATE INDEX idx_readings_point_dt ON MON_DISPLACEMENT_READINGS (PointID, Datetime)")
+    conn.close()
+    return [plate_id(i) for i in range(plates)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic settlement plate database")
+    parser.add_argument("--plates", type=int, default=1900)
+    parser.add_argument("--days", type=int, default=540)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=os.path.join("static", "cache", "synthetic.sqlite"))
+    args = parser.parse_args()
+
+    ids = generate_site(args.out, args.plates, args.days, seed=args.seed)
+    print(f"Wrote {len(ids)} plates to {args.out} ({ids[0]} .. {ids[-1]})")
@@ -0,0 +1,200 @@
+"""
+Asyncio streaming client for Ollama's native /api/chat endpoint (newline-delimited JSON).
+
+The native endpoint is used rather than the OpenAI-compatible /v1/chat/completions because only it
+honours per-request `keep_alive` and `options` such as num_ctx.
+
+One event loop runs in a background thread and owns a pooled aiohttp session, so a slow
+generation holds a connection and a coroutine rather than a blocking socket per Streamlit thread.
+Each model has its own concurrency limit (requests over the limit wait their turn), every request
+has connect / between-chunk / total timeouts, and closing the token generator (the user navigates
+away and Streamlit stops the script run) cancels the request on the server side of the loop.
+
+Async callers use `stream_chat`; sync code (LLMRouter.handle_user) iterates `stream`.
+"""
+import asyncio
+import atexit
+import json
+import os
+import queue
+import re
+import threading
+import time
+
+import aiohttp
+
+OLLAMA_URL = os.environ.get("NL2FUNC_OLLAMA_URL", "http://localhost:11434").rstrip("/")
+OLLAMA_KEEP_ALIVE = os.environ.get("NL2FUNC_OLLAMA_KEEP_ALIVE", "30m")  # how long Ollama keeps a model loaded after a request
+
+LLM_POOL_SIZE = int(os.environ.get("NL2FUNC_LLM_POOL_SIZE", 16))                   # open connections to Ollama
+LLM_MODEL_CONCURRENCY = int(os.environ.get("NL2FUNC_LLM_MODEL_CONCURRENCY", 2))    # generations per model at once
+LLM_CONNECT_TIMEOUT = float(os.environ.get("NL2FUNC_LLM_CONNECT_TIMEOUT", 10))     # seconds
+LLM_READ_TIMEOUT = float(os.environ.get("NL2FUNC_LLM_READ_TIMEOUT", 180))          # seconds between chunks, covers model load
+LLM_TOTAL_TIMEOUT = float(os.environ.get("NL2FUNC_LLM_TOTAL_TIMEOUT", 900))        # seconds for a whole generation
+
+_DONE = object()
+
+
+def parse_keep_alive(value, default=300):
+    """Ollama keep_alive ("30m", "1h", "45s", seconds as a number, negative = forever) -> seconds."""
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r"(-?\d+(?:\.\d+)?)\s*([smh]?)", str(value).strip())
+    if not match:
+        return default
+    return float(match.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+
+
+class LLMClient:
+    def __init__(self, base_url=OLLAMA_URL, pool_size=LLM_POOL_SIZE, model_concurrency=LLM_MODEL_CONCURRENCY):
+        self.base_url = base_url.rstrip("/")
+        self.chat_url = f"{self.base_url}/api/chat"
+        self.pool_size = pool_size
+        self.model_concurrency = model_concurrency
+        self._session = None
+        self._semaphores = {}  # model -> asyncio.Semaphore, only touched on the loop thread
+        self._active = 0
+        self._waiting = 0
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="llm-client", daemon=True).start()
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                headers={"Content-Type": "application/json", "Authorization": "Bearer ollama"})
+        return self._session
+
+    def _semaphore(self, model):
+        if model not in self._semaphores:
+            self._semaphores[model] = asyncio.Semaphore(self.model_concurrency)
+        return self._semaphores[model]
+
+    async def stream_chat(self, messages, model, timeout=None, options=None):
+        """Yield content tokens for one streamed chat. Must run on this client's loop."""
+        timeout = timeout or aiohttp.ClientTimeout(total=LLM_TOTAL_TIMEOUT, connect=LLM_CONNECT_TIMEOUT,
+                                                   sock_read=LLM_READ_TIMEOUT)
+        payload = {"model": model, "messages": messages, "stream": True, "keep_alive": OLLAMA_KEEP_ALIVE}
+        if options:
+            payload["options"] = options
+        t0 = time.perf_counter()
+        semaphore = self._semaphore(model)
+        self._waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        waited = time.perf_counter() - t0
+        self._active += 1
+        try:
+            async with self._get_session().post(self.chat_url, json=payload, timeout=timeout) as resp:
+                resp.raise_for_status()
+                first_token = None
+                async for raw_line in resp.content:
+                    line = raw_line.decode("utf-8", errors="replace").strip()
+                    if not line:
+                        continue
+                    try:
+                        chunk = json.loads(line)
+                    except Exception as e:
+                        print(f"[Warning] Stream decode failed: {e}")
+                        continue
+                    if chunk.get("error"):
+                        raise RuntimeError(f"Ollama error: {chunk['error']}")
+                    content = (chunk.get("message") or {}).get("content")
+                    if content:
+                        if first_token is None:
+                            first_token = time.perf_counter() - t0
+                            print(f"[DEBUG][LLM] {model} TTFT {first_token * 1000:.0f} ms"
+                                  + (f" (waited {waited * 1000:.0f} ms for a slot)" if waited > 0.05 else ""))
+                        yield content
+                    if chunk.get("done"):
+                        # prompt_eval_count only counts tokens not served from the cached prefix
+                        if "prompt_eval_count" in chunk:
+                            print(f"[DEBUG][LLM] {model} evaluated {chunk['prompt_eval_count']} prompt tokens in "
+                                  f"{chunk.get('prompt_eval_duration', 0) / 1e6:.0f} ms")
+                        # keep reading to the end of the body so the connection goes back to the pool
+        finally:
+            self._active -= 1
+            semaphore.release()
+
+    async def request_json(self, method, path, payload=None, timeout=None):
+        """Plain (non-streamed) JSON call to the Ollama API, e.g. ("GET", "/api/ps")."""
+        timeout = timeout or aiohttp.ClientTimeout(total=LLM_TOTAL_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+        async with self._get_session().request(method, self.base_url + path, json=payload, timeout=timeout) as resp:
+            resp.raise_for_status()
+            return await resp.json(content_type=None)
+
+    def stream(self, messages, model, timeout=None, options=None):
+        """
+        Sync generator over stream_chat for code running outside the loop. Closing it (or letting
+        it be garbage collected) before the end cancels the request.
+        """
+        tokens = queue.Queue()
+
+        async def pump():
+            try:
+                async for token in self.stream_chat(messages, model, timeout=timeout, options=options):
+                    tokens.put(token)
+            except asyncio.CancelledError:
+                raise
+            except BaseException as e:
+                tokens.put(e)
+            finally:
+                tokens.put(_DONE)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._loop)
+        finished = False
+        try:
+            while True:
+                item = tokens.get()
+                if item is _DONE:
+                    finished = True
+                    break
+                if isinstance(item, BaseException):
+                    finished = True
+                    raise item
+                yield item
+        finally:
+            if not finished:
+                future.cancel()
+                print(f"[DEBUG][LLM] {model} request cancelled")
+
+    def submit(self, coro):
+        """Schedule a coroutine on the client's loop from sync code; returns a concurrent Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the client's loop from sync code and wait for its result."""
+        return self.submit(coro).result(timeout)
+
+    def close(self):
+        if self._session is not None and not self._session.closed:
+            self.run(self._session.close(), timeout=5)
+
+    def stats(self):
+        """Generations streaming and requests waiting for a per-model slot right now."""
+        return {"active": self._active, "waiting": self._waiting}
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient()
+            atexit.register(_client.close)
+        return _client
+
+
+def set_llm_client(client):
+    """Swap the shared client (e.g. one pointed at the mock server in benchmarks)."""
+    global _client
+    with _client_lock:
+        _client = client
+    return client
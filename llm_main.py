@@ -1,22 +1,15 @@
 #!/usr/bin/env python3
-import requests
-import functools
-import json
 import time
 import re
+import queue
+import threading
+import weakref
 
-from transformers import T5Tokenizer, T5ForConditionalGeneration
-
-
-# Save locally for conversion
-try:
-    tokenizer = T5Tokenizer.from_pretrained("./t5-small")
-    model = T5ForConditionalGeneration.from_pretrained("./t5-small")
-except:
-    tokenizer = T5Tokenizer.from_pretrained("t5-small")
-    model = T5ForConditionalGeneration.from_pretrained("t5-small")
-    model.save_pretrained("./t5-small")
-    tokenizer.save_pretrained("./t5-small")
+from summarizer import get_summarizer
+from llm_client import get_llm_client
+from model_residency import get_model_residency
+from response_cache import get_response_cache, response_key, replay
+from prompt_budget import fit_prompt, context_options, PROMPT_BUDGET
 
 
 # Configuration
@@ -32,10 +25,7 @@ def strip_think(text: str) -> str:
 
 def get_summary(text):
     print(f"[Debug][Summarizer] Input length: {len(text)} chars")
-    input_text = "lightly summarize the following text: " + text
-    inputs = tokenizer(input_text, return_tensors="pt", max_length=2048, truncation=True)
-    outputs = model.generate(**inputs, max_length=1024, min_length=30, length_penalty=1.0, num_beams=4, early_stopping=True)
-    summary = tokenizer.decode(outputs[0], skip_special_tokens=True)
+    summary = get_summarizer().summarize(text)
     print(f"[Debug][Summarizer] Summary length: {len(summary)} chars")
     print(f"[Debug][Summarizer] Summary preview: {summary[:100]}...")
     return summary
@@ -58,7 +48,7 @@ def fused_system_message(system, func_guidelines=None):
 FUNCTION_GUIDELINES = {
     "Asaoka_data": '''
 === FUNCTIONAL INSTRUCTIONS ===
-- You will receive a JSON list of settlement plate data relevant to the user query.
+- You will receive a table of settlement plate data relevant to the user query, one row per plate (settlements in m, '-' where a value is missing).
 - Provide specific, plate-level insights based on the background domain knowledge, focusing on the consolidation degree, settlement rate, compliance status, and notable trends for each plate.
 - When asked for summaries or overviews, provide a table listing each Settlement Plate’s ID along with raw values for:
   - latest_Settlement,
@@ -87,7 +77,7 @@ FUNCTION_GUIDELINES = {
     "SM_overview":'''
 === FUNCTIONAL INSTRUCTIONS ===
 
-- You will receive a JSON list of settlement plates relevant to the user query.
+- You will receive a table of settlement plates relevant to the user query, one row per plate (settlements in m, '-' where a value is missing).
 - Provide insights across all plates, highlighting compliance patterns, relationships between holding period and settlement rate, and any anomalies.
 - After the insights, provide a table listing each Settlement Plate’s ID along with raw values for:
   - latest_Settlement,
@@ -102,88 +92,66 @@ FUNCTION_GUIDELINES = {
 }
 
 # Build full message list
-def build_messages(system, memory, user_input, classifier_data=None, func_guidelines=None, func_output=None):
+def build_messages(system, memory, user_input, classifier_data=None, func_guidelines=None, func_output=None,
+                   budget=PROMPT_BUDGET):
+    """
+    Messages in cache-friendly order: the static system instructions first, byte-identical on every
+    turn and in every session so Ollama can reuse the evaluated prefix, then the per-request
+    functional instructions, function output and history, then the user query.
+    """
     messages = []
-    # Fuse system instructions and functional guidelines
-    fused_content = fused_system_message(system, func_guidelines)
-    # Fuse output and convo history if present
+    # REMOVE @recap from the user message
+    cleaned_user_input = user_input.replace("@recap", "").strip()
+    history = memory if "@recap" in user_input else []
+
+    # Fit the sections into the token budget, cutting lowest priority first and the static prefix last
+    background = system[0]["content"].strip() if system else ""
+    base_instructions = fused_system_message(system[1:])
+    instructions = fused_system_message(system[1:], func_guidelines)
+    history, instructions, func_output, background = fit_prompt(
+        cleaned_user_input, history, instructions, func_output, background, budget=budget,
+        static_instructions=base_instructions)
+    # Only a prompt far over budget cuts into the static part (and so changes the prefix)
+    if instructions.startswith(base_instructions):
+        guidelines = instructions[len(base_instructions):].strip()
+    else:
+        base_instructions, guidelines = instructions, ""
+
+    # Static prefix: background and general instructions
+    static_content = '\n\n'.join(part for part in (background, base_instructions) if part)
+    if static_content:
+        messages.append({"role": "system", "content": static_content})
+    # Volatile part: functional guidelines, function output and convo history
     block = ""
     if classifier_data or func_output:
         if classifier_data:
             block += f"Function: {classifier_data.get('Function')}\nParams: {classifier_data.get('Params')}\n"
         if func_output:
             block += f"Output: {func_output}\n"
-    if "@recap" in user_input and memory:
+    if history:
         recap = "=== PREVIOUS CONVERSATION ===\n"
-        for i, (user_msg, assistant_msg) in enumerate(memory, 1):
+        for i, (user_msg, assistant_msg) in enumerate(history, 1):
             recap += f"User ({i}): {user_msg.strip()}\n"
             recap += f"Assistant ({i}): {assistant_msg.strip()}\n"
         block += recap
-    # Add the fused system message
-    if block:
-        fused_content += '\n\n' + block.strip()
-    messages.append({"role": "system", "content": fused_content})
-    # Always add the user query last, but REMOVE @recap from the message
-    cleaned_user_input = user_input.replace("@recap", "").strip()
+    volatile_content = '\n\n'.join(part for part in (guidelines, block.strip()) if part)
+    if volatile_content:
+        messages.append({"role": "system", "content": volatile_content})
+    # Always add the user query last
     messages.append({"role": "user", "content": "\n === USER QUERY ===\n" + cleaned_user_input})
     return messages
 
 # One-time warm-up for model
 def warmup_model(model: str):
+    """Load a model now and wait for it (LLMRouter warms models in the background instead)."""
     print(f"[Debug] Warming up model: {model}")
-    try:
-        payload = {
-            "model": model,
-            "messages": [{"role": "user", "content": "Hello"}],
-            "stream": True
-        }
-        r = requests.post("http://localhost:11434/v1/chat/completions",
-                          headers={"Content-Type": "application/json"},
-                          json=payload, stream=True)
-        for line in r.iter_lines(decode_unicode=True):
-            if line and "[DONE]" in line:
-                break
-        r.close()
+    if get_model_residency().warm(model).result():
         print(f"[Debug] Warm-up complete for: {model}")
-    except Exception as e:
-        print(f"[Error] Warm-up failed: {e}")
 
 # Streaming helper
-@functools.lru_cache(maxsize=3)
-def get_cached_model_session(model_name: str):
-    """Cache model sessions to avoid repeated loading"""
-    session = requests.Session()
-    session.headers.update({
-        "Content-Type": "application/json",
-        "Authorization": "Bearer ollama"
-    })
-    # Keep persistent connections per model
-    return session
 def ollama_stream(messages: list, model: str):
-    session = get_cached_model_session(model)
-    url = "http://localhost:11434/v1/chat/completions"
-    payload = {
-        "model": model,
-        "messages": messages,
-        "stream": True
-    }
-
-    with session.post(url, json=payload, stream=True) as resp:
-        resp.raise_for_status()
-        for raw_line in resp.iter_lines(decode_unicode=True):
-            if not raw_line or not raw_line.startswith("data:"):
-                continue
-            data = raw_line[len("data:"):].strip()
-            if data == "[DONE]":
-                break
-            try:
-                chunk = json.loads(data)
-                delta = chunk["choices"][0]["delta"]
-                if "content" in delta:
-                    yield delta["content"]
-            except Exception as e:
-                print(f"[Warning] Stream decode failed: {e}")
-                continue
+    """Tokens from the shared async client; closing this generator cancels the request."""
+    yield from get_llm_client().stream(messages, model, options=context_options())
 
 # Model selector
 def select_model(prompt: str) -> str:
@@ -193,12 +161,111 @@ def select_model(prompt: str) -> str:
         return MODEL_CONFIG["deep"]
     return MODEL_CONFIG["text"]
 
+SUMMARY_FALLBACK_CHARS = 400  # raw text kept for an entry whose summary is still being computed
+
+# One summarizer thread shared by every router (one per Streamlit session). It holds routers only
+# through weak references, so a closed session's router and memory can be garbage collected.
+_summary_queue = None
+_summary_queue_lock = threading.Lock()
+
+
+def get_summary_queue():
+    """Queue of (weakref to LLMRouter, MemoryEntry) for the shared summarizer thread, started on first use."""
+    global _summary_queue
+    with _summary_queue_lock:
+        if _summary_queue is None:
+            _summary_queue = queue.Queue()
+            threading.Thread(target=_summary_worker, args=(_summary_queue,), name="memory-summarizer",
+                             daemon=True).start()
+        return _summary_queue
+
+
+def _summary_worker(summary_queue):
+    while True:
+        # take everything queued so far and summarize it as one batch per router
+        batch = [summary_queue.get()]
+        while True:
+            try:
+                batch.append(summary_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            _summarize_batch(batch)
+        finally:
+            for _ in batch:
+                summary_queue.task_done()
+            del batch  # don't keep the last batch's entries while waiting
+
+
+def _summarize_batch(batch):
+    groups = {}  # id(router) -> (router, entries); strong references only while this runs
+    for ref, entry in batch:
+        router = ref()
+        if router is not None:  # None: the session is gone
+            groups.setdefault(id(router), (router, []))[1].append(entry)
+    for router, entries in groups.values():
+        try:
+            router._summarize_entries(entries)
+        except Exception as e:
+            print(f"[Warning] Memory summarization failed: {e}")
+
+
+class MemoryEntry:
+    """
+    One user/assistant pair in the router's memory with its summaries cached per level:
+    level 0 is the raw text, level n is the level n-1 text summarized once more.
+    `level` is the level the entry should be shown at; summaries fill in behind it.
+    """
+
+    def __init__(self, user_msg, assistant_msg):
+        self.summaries = {0: (user_msg, assistant_msg)}
+        self.level = 0
+
+    def view(self):
+        """(user, assistant) at the highest ready level up to `level`; raw text is truncated if no summary is ready yet."""
+        ready = max(lvl for lvl in tuple(self.summaries) if lvl <= self.level)
+        user_msg, assistant_msg = self.summaries[ready]
+        if ready == 0 and self.level > 0:
+            user_msg, assistant_msg = user_msg[:SUMMARY_FALLBACK_CHARS], assistant_msg[:SUMMARY_FALLBACK_CHARS]
+        return user_msg, assistant_msg
+
+    @property
+    def user(self):
+        return self.view()[0]
+
+    @property
+    def assistant(self):
+        return self.view()[1]
+
+    @property
+    def pending(self):
+        return self.level not in self.summaries
+
+    def next_missing(self):
+        """Lowest level up to `level` that still needs summarizing, or None."""
+        for lvl in range(1, self.level + 1):
+            if lvl not in self.summaries:
+                return lvl
+        return None
+
+
 # ===== Main LLM Router =====
 class LLMRouter:
-    def __init__(self, max_turns=3):
-        self.memory = []  # [(user_msg, assistant_msg, summary_level)]
+    def __init__(self, max_turns=3, max_summary_level=2, background_summaries=True, summarize_memory=True,
+                 warm_models=True, response_cache=True):
+        self.memory = []  # [MemoryEntry], newest first
         self.max_turns = max_turns
-        self.warmed_up_models = set()
+        self.max_summary_level = max_summary_level  # older entries stay at this level instead of being re-summarized
+        self._memory_lock = threading.Lock()
+
+        # Summaries are computed off the response path: handle_user only queues entries and the
+        # next turn uses whatever summaries are ready by then. With summarize_memory=False the T5
+        # summarizer is never loaded and older entries keep their truncated raw text.
+        self.summarize_memory = summarize_memory
+        self.background_summaries = background_summaries and summarize_memory
+        self._summary_queue = get_summary_queue() if self.background_summaries else None
+        self.residency = get_model_residency()
+        self.response_cache = get_response_cache() if response_cache else None
 
         # System context
         self.system_messages = [
@@ -255,53 +322,93 @@ class LLMRouter:
             ''')}
         ]
 
-        # Warm up default model
-        #warmup_model(MODEL_CONFIG["text"])
-        self.warmed_up_models.add(MODEL_CONFIG["text"])
+        # Load every configured model in the background so the first @think/@deep turn does not wait
+        if warm_models:
+            self.residency.warm_all(MODEL_CONFIG[key] for key in ("text", "think", "deep"))
+
+    def _summarize_pairs(self, pairs):
+        """Summarize user-assistant conversation pairs in one batch"""
+        summaries = get_summarizer().summarize_pairs(pairs)
+        return [("User input: " + u, "Assistant response: " + a) for u, a in summaries]
+
+    def _fill_entries(self, entries):
+        """Bring entries up to their level, one batched summarizer call per missing level."""
+        while True:
+            todo = [(entry, entry.next_missing()) for entry in entries]
+            todo = [(entry, lvl) for entry, lvl in todo if lvl is not None]
+            if not todo:
+                return
+            results = self._summarize_pairs([entry.summaries[lvl - 1] for entry, lvl in todo])
+            for (entry, lvl), result in zip(todo, results):
+                entry.summaries[lvl] = result
 
-    def _summarize_pair(self, user_msg, assistant_msg):
-        """Summarize a user-assistant conversation pair"""
-        summarized_user = "User input: " + get_summary(f"User: {user_msg}")
-        summarized_response = "Assistant response: " + get_summary(f"Assistant: {assistant_msg}")
-        return summarized_user, summarized_response
-    
     def _update_memory_hierarchical(self, new_user_input, new_response):
-        """True progressive hierarchical memory - independent of max_turns"""
-        
-        # Step 1: Add new conversation at the front
-        self.memory.insert(0, (new_user_input, new_response, 0))
-        
-        # Step 2: Progressive summarization - move each old item up one level
-        updated_memory = [(new_user_input, new_response, 0)]  # Keep newest as-is
-        
-        for user_msg, assistant_msg, level in self.memory[1:]:  # Skip the newest we just added
-            # Summarize and increase level for ALL older conversations
-            summ_user, summ_assistant = self._summarize_pair(user_msg, assistant_msg)
-            updated_memory.append((summ_user, summ_assistant, level + 1))
-        
-        # Step 3: Apply max_turns limit AFTER progressive summarization
-        self.memory = updated_memory[:self.max_turns]
+        """
+        Progressive hierarchical memory: an entry's summary level is its age, capped at
+        max_summary_level. Each level is summarized once and cached on the entry, so a turn only
+        summarizes entries whose level changes, and never ones that are about to be dropped.
+        """
+        with self._memory_lock:
+            # Step 1: Add new conversation at the front and drop what falls out of max_turns
+            self.memory.insert(0, MemoryEntry(new_user_input, new_response))
+            self.memory = self.memory[:self.max_turns]
+
+            # Step 2: Move each older entry up to the level for its age
+            changed = []
+            for age, entry in enumerate(self.memory):
+                level = min(age, self.max_summary_level)
+                if entry.level != level:
+                    entry.level = level
+                    changed.append(entry)
+
+        # Step 3: Summarize the entries that moved, in the background unless disabled
+        if not self.summarize_memory:
+            return
+        if not self.background_summaries:
+            self._fill_entries(changed)
+            return
+        ref = weakref.ref(self)
+        for entry in changed:
+            self._summary_queue.put((ref, entry))
+
+    def _summarize_entries(self, entries):
+        """Summarize the queued entries that are still in memory and still pending (summary worker)."""
+        with self._memory_lock:
+            live = [e for e in self.memory if e.pending and any(e is q for q in entries)]
+        if live:
+            t0 = time.perf_counter()
+            self._fill_entries(live)
+            print(f"[DEBUG][Memory] Summarized {len(live)} entries in {time.perf_counter() - t0:.2f} s")
+
+    def wait_for_summaries(self):
+        """Block until every queued summary (of all routers) is done (CLI and benchmarks)."""
+        if self._summary_queue is not None:
+            self._summary_queue.join()
 
     def debug_memory_structure(self):
         """Debug method to visualize memory structure"""
         print("\n=== MEMORY STRUCTURE ===")
-        for i, (user_msg, assistant_msg, level) in enumerate(self.memory):
-            indent = "  " * level
-            print(f"{indent}Entry {i} (Level {level}):")
-            print(f"{indent}  User: {user_msg[:60]}...")
-            print(f"{indent}  Assistant: {assistant_msg[:60]}...")
+        for i, entry in enumerate(self.memory):
+            indent = "  " * entry.level
+            print(f"{indent}Entry {i} (Level {entry.level}, cached levels {sorted(entry.summaries)}{', pending' if entry.pending else ''}):")
+            print(f"{indent}  User: {entry.user[:60]}...")
+            print(f"{indent}  Assistant: {entry.assistant[:60]}...")
         print("========================\n")
 
 
-    def handle_user(self, user_input: str, func_name=None, classifier_data=None, func_output=None, stream=False):
+    def record_turn(self, user_input, response):
+        """Add a turn answered without the LLM (e.g. a queued report) to memory."""
+        cleaned_input = strip_think(user_input).replace("@recap", "").strip()
+        self._update_memory_hierarchical(cleaned_input, response)
+
+    def handle_user(self, user_input: str, func_name=None, classifier_data=None, func_output=None, stream=False,
+                    data_version=None):
         cleaned_input = strip_think(user_input)
         model = select_model(cleaned_input)
 
-        if model not in self.warmed_up_models:
-            self.warmed_up_models.add(model)
-
         func_guidelines = FUNCTION_GUIDELINES.get(func_name)
-        memory_for_messages = [(item[0], item[1]) for item in self.memory]
+        with self._memory_lock:
+            memory_for_messages = [entry.view() for entry in self.memory]
         messages = build_messages(
             self.system_messages,
             memory_for_messages,
@@ -310,15 +417,31 @@ class LLMRouter:
             func_guidelines=func_guidelines,
             func_output=func_output
         )
-        print(f"[DEBUG] Memory structure: {[(f'L{item[2]}', item[0][:30]+'...') for item in self.memory]}")
+        print(f"[DEBUG] Memory structure: {[(f'L{entry.level}', entry.user[:30]+'...') for entry in self.memory]}")
         print("[DEBUG] FINAL MESSAGE \n", messages)
 
+        # Only the default text model is cached; @think/@deep answers are always generated fresh
+        use_cache = self.response_cache is not None and model == MODEL_CONFIG["text"]
+        key = response_key(model, messages, data_version) if use_cache else None
+        cached = self.response_cache.get(key) if use_cache else None
+        if cached is None and not self.residency.is_resident(model):
+            print(f"[DEBUG][Residency] {model} is not loaded yet; this turn includes the load time")
+
         if stream:
-            # Streaming mode: yield tokens as they arrive
+            # Streaming mode: yield tokens as they arrive (replayed from the cache on a hit)
             response = ""
-            for token in ollama_stream(messages, model):
-                yield token
-                response += token
+            if cached is not None:
+                print(f"[DEBUG][ResponseCache] hit for {model} ({len(cached)} chars)")
+                for token in replay(cached):
+                    yield token
+                    response += token
+            else:
+                for token in ollama_stream(messages, model):
+                    yield token
+                    response += token
+                self.residency.touch(model)
+                if use_cache:
+                    self.response_cache.put(key, response)
             response = strip_think(response)
             # After streaming, update memory
             # summary = get_summary(response)
@@ -0,0 +1,142 @@
+"""
+Keeps track of which chat models Ollama has loaded and loads them ahead of use.
+
+A model is loaded with an empty /api/generate request (no tokens are generated) carrying
+keep_alive, so the first real @think or @deep question does not pay the load time. warm_all loads
+several models concurrently in the background; refresh reads /api/ps to pick up models that are
+already resident or have been unloaded behind our back, with the expiry Ollama reports.
+"""
+import re
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+
+from llm_client import get_llm_client, parse_keep_alive, OLLAMA_KEEP_ALIVE
+from prompt_budget import context_options
+
+
+def model_name(name):
+    """Ollama reports untagged models as name:latest."""
+    return name if ":" in name else f"{name}:latest"
+
+
+def parse_expiry(value):
+    """/api/ps expires_at (RFC 3339, nanosecond fractions) -> epoch seconds, or None."""
+    if not value:
+        return None
+    value = re.sub(r"(\.\d{6})\d+", r"\1", value).replace("Z", "+00:00")
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return None
+
+
+class ModelResidency:
+    def __init__(self, client=None, keep_alive=OLLAMA_KEEP_ALIVE):
+        self.client = client
+        self.keep_alive = keep_alive
+        self.state = {}       # model -> "loading" | "loaded" | "failed" | "unloaded"
+        self.expires_at = {}  # model -> time.time() the model should stay loaded until
+        self.errors = {}
+        self._loading = {}    # model -> concurrent.futures.Future of the load
+        self._lock = threading.Lock()
+
+    def _client(self):
+        return self.client or get_llm_client()
+
+    def is_resident(self, model):
+        model = model_name(model)
+        with self._lock:
+            return self.state.get(model) == "loaded" and self.expires_at.get(model, 0) > time.time()
+
+    def touch(self, model):
+        """A chat request for the model just finished; /api/chat honours our keep_alive, so it stays loaded that long."""
+        model = model_name(model)
+        with self._lock:
+            self.state[model] = "loaded"
+            self.expires_at[model] = time.time() + self._keep_alive_seconds()
+
+    def _keep_alive_seconds(self):
+        seconds = parse_keep_alive(self.keep_alive)
+        return float("inf") if seconds < 0 else seconds
+
+    async def _load(self, model):
+        t0 = time.perf_counter()
+        try:
+            # same num_ctx as chat requests, otherwise Ollama reloads the model on the first question
+            await self._client().request_json("POST", "/api/generate", {"model": model, "keep_alive": self.keep_alive,
+                                                                        "options": context_options()})
+        except Exception as e:
+            with self._lock:
+                self.state[model_name(model)] = "failed"
+                self.errors[model_name(model)] = f"{type(e).__name__}: {e}"
+            print(f"[Warning] Warm-up failed for {model}: {type(e).__name__}: {e}")
+            return False
+        self.touch(model)
+        print(f"[DEBUG][Residency] {model} loaded in {time.perf_counter() - t0:.1f} s")
+        return True
+
+    def warm(self, model):
+        """
+        Start loading a model in the background unless it is resident or already loading. Returns
+        a future that resolves to True once it is loaded (False if loading failed).
+        """
+        name = model_name(model)
+        with self._lock:
+            if self.state.get(name) == "loaded" and self.expires_at.get(name, 0) > time.time():
+                future = Future()
+                future.set_result(True)
+                return future
+            if name in self._loading and not self._loading[name].done():
+                return self._loading[name]
+            self.state[name] = "loading"
+            self._loading[name] = self._client().submit(self._load(model))
+            return self._loading[name]
+
+    def warm_all(self, models):
+        """Load all models concurrently in the background, checking /api/ps first for ones already loaded."""
+        models = list(dict.fromkeys(models))
+
+        def run():
+            self.refresh()
+            for future in [self.warm(model) for model in models]:
+                future.result()
+
+        threading.Thread(target=run, name="model-warmup", daemon=True).start()
+
+    def refresh(self):
+        """Sync state with the models Ollama reports as loaded."""
+        try:
+            client = self._client()
+            running = client.run(client.request_json("GET", "/api/ps"), timeout=10).get("models") or []
+        except Exception as e:
+            print(f"[Warning] Could not read loaded models: {e}")
+            return self.status()
+        now = time.time()
+        loaded = {model_name(m.get("name") or m.get("model", "")): m for m in running}
+        with self._lock:
+            for name, info in loaded.items():
+                self.state[name] = "loaded"
+                expiry = parse_expiry(info.get("expires_at"))
+                self.expires_at[name] = expiry if expiry is not None else now + self._keep_alive_seconds()
+            for name, state in list(self.state.items()):
+                if state == "loaded" and name not in loaded:
+                    self.state[name] = "unloaded"
+        return self.status()
+
+    def status(self):
+        with self._lock:
+            return dict(self.state)
+
+
+_residency = None
+_residency_lock = threading.Lock()
+
+
+def get_model_residency():
+    global _residency
+    with _residency_lock:
+        if _residency is None:
+            _residency = ModelResidency()
+        return _residency
@@ -0,0 +1,131 @@
+"""
+Token budget for the prompt sent to the chat model.
+
+The prompt is measured per section and, when it is over budget, cut back from the lowest-priority
+section upwards, following the priority order in the system instructions:
+
+    1. USER QUERY            never cut
+    2. CONVERSATION HISTORY  oldest pairs dropped (third)
+    3. FUNCTIONAL INSTRUCTIONS  per-function guidelines truncated (second)
+    4. USER DATA             rows dropped with a note of how many, also capped on its own (first)
+    5. BACKGROUND            truncated (last)
+
+The background is lowest priority but, with the general instructions, it is the static prompt
+prefix Ollama reuses between turns, so it is only cut once history is gone, and the general
+instructions only if that is still not enough.
+
+Token counts are an estimate (about four characters per token for these models). The context
+window requested from Ollama (options.num_ctx) is the prompt budget plus room for the reply, so a
+prompt within budget is never silently cut from the front by the server's smaller default.
+"""
+import math
+import os
+
+PROMPT_BUDGET = int(os.environ.get("NL2FUNC_PROMPT_BUDGET", 6000))            # tokens for the whole prompt
+FUNC_OUTPUT_BUDGET = int(os.environ.get("NL2FUNC_FUNC_OUTPUT_BUDGET", 2500))  # tokens for function output alone
+REPLY_BUDGET = int(os.environ.get("NL2FUNC_REPLY_BUDGET", 2048))              # tokens left in the context for the answer
+NUM_CTX = int(os.environ.get("NL2FUNC_NUM_CTX", PROMPT_BUDGET + REPLY_BUDGET))  # context window requested from Ollama
+CHARS_PER_TOKEN = 4
+
+# highest priority first, as in the system instructions
+SECTIONS = ["query", "history", "instructions", "data", "background"]
+# what fit_prompt cuts first; the static prefix (background, general instructions) goes last
+CUT_ORDER = ["data", "instructions", "history", "background"]
+
+
+def context_options():
+    """Ollama request options that make the context window fit the budgeted prompt and a reply."""
+    return {"num_ctx": NUM_CTX}
+
+
+def count_tokens(text):
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def history_tokens(history):
+    return sum(count_tokens(u) + count_tokens(a) for u, a in history or [])
+
+
+def truncate(text, max_tokens):
+    """First max_tokens worth of text, cut at a line or word boundary where possible."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    cut = text[:max_tokens * CHARS_PER_TOKEN]
+    boundary = max(cut.rfind("\n"), cut.rfind(" "))
+    if boundary > len(cut) // 2:
+        cut = cut[:boundary]
+    return cut.rstrip() + " [...]"
+
+
+def reduce_rows(text, max_tokens):
+    """
+    Keep whole lines (table header and rows) from the top until max_tokens is reached and note
+    how many were left out. A single oversized line is truncated instead.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    lines = text.splitlines()
+    kept, used = [], 0
+    for line in lines:
+        cost = count_tokens(line) + 1
+        if used + cost > max_tokens - 20:  # room for the omission note
+            break
+        kept.append(line)
+        used += cost
+    if not kept:
+        return truncate(text, max_tokens)
+    omitted = len(lines) - len(kept)
+    return "\n".join(kept) + f"\n[... {omitted} of {len(lines)} lines omitted to fit the prompt budget]"
+
+
+def fit_prompt(query, history, instructions, data, background, budget=PROMPT_BUDGET, data_budget=FUNC_OUTPUT_BUDGET,
+               static_instructions=""):
+    """
+    Returns (history, instructions, data, background) cut down so the whole prompt fits in budget,
+    and logs the token count of each section before and after. `static_instructions` is the leading
+    part of `instructions` that belongs to the static prefix; it is only cut after the background.
+    """
+    history = list(history or [])
+    before = {"query": count_tokens(query), "history": history_tokens(history),
+              "instructions": count_tokens(instructions), "data": count_tokens(data),
+              "background": count_tokens(background)}
+
+    if before["data"] > data_budget:
+        data = reduce_rows(data, data_budget)
+
+    def total():
+        return (count_tokens(query) + history_tokens(history) + count_tokens(instructions)
+                + count_tokens(data) + count_tokens(background))
+
+    for section in CUT_ORDER:
+        over = total() - budget
+        if over <= 0:
+            break
+        if section == "background":
+            background = truncate(background, count_tokens(background) - over)
+        elif section == "data":
+            data = reduce_rows(data, count_tokens(data) - over)
+        elif section == "instructions":
+            if instructions.startswith(static_instructions):
+                guidelines = instructions[len(static_instructions):]
+                instructions = static_instructions + truncate(guidelines, count_tokens(guidelines) - over)
+            else:
+                instructions = truncate(instructions, count_tokens(instructions) - over)
+        elif section == "history":
+            while history and total() > budget:
+                history.pop()  # memory is newest first, so this drops the oldest pair
+    over = total() - budget
+    if over > 0:
+        instructions = truncate(instructions, count_tokens(instructions) - over)
+
+    after = {"query": count_tokens(query), "history": history_tokens(history),
+             "instructions": count_tokens(instructions), "data": count_tokens(data),
+             "background": count_tokens(background)}
+    sections = " ".join(f"{name}={before[name]}" + (f"->{after[name]}" if after[name] != before[name] else "")
+                        for name in SECTIONS)
+    print(f"[DEBUG][Budget] {sections} total={sum(after.values())}/{budget}")
+    return history, instructions, data, background
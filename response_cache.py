@@ -0,0 +1,96 @@
+"""
+Cache of finished LLM responses, shared by all sessions.
+
+Asking the same question over the same function output (regenerating an overview summary for the
+same plates on the same day) produces the same prompt, so the answer is looked up instead of
+generated again. The key is the model, a hash of the final message list and the version of the
+readings the function output was computed from (see helpers.backends.readings_version), so new
+readings retire earlier answers even when a snapshot still renders the same text; entries expire after a TTL and the cache is bounded by entry count and size,
+least recently used first. Hits are replayed as a token stream so callers see no difference.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+RESPONSE_CACHE_TTL = int(os.environ.get("NL2FUNC_RESPONSE_CACHE_TTL", 6 * 3600))       # seconds
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("NL2FUNC_RESPONSE_CACHE_MAX_ENTRIES", 256))
+RESPONSE_CACHE_MAX_MB = float(os.environ.get("NL2FUNC_RESPONSE_CACHE_MAX_MB", 16))
+
+
+def response_key(model, messages, version=None):
+    digest = hashlib.sha256(json.dumps(messages, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+    return (model, digest, version)
+
+
+def replay(response):
+    """The cached text as word-sized tokens; "".join gives it back unchanged."""
+    for token in re.findall(r"\S*\s*", response):
+        if token:
+            yield token
+
+
+class ResponseCache:
+    def __init__(self, ttl=RESPONSE_CACHE_TTL, max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+                 max_bytes=int(RESPONSE_CACHE_MAX_MB * 1024 * 1024)):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (stored_at, response), least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[0] > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, response):
+        size = len(response.encode("utf-8"))
+        if not response or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.time(), response)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        _, response = self._entries.pop(key)
+        self._bytes -= len(response.encode("utf-8"))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
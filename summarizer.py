@@ -0,0 +1,105 @@
+"""
+T5-small summarizer used for the router's conversation memory.
+
+Modes trade summary quality for latency:
+  quality  4-beam search, long inputs/outputs (the original get_summary settings)
+  fast     2-beam search, 512-token inputs, short summaries
+  greedy   no beam search, 512-token inputs, short summaries
+Texts are summarized in batches (both halves of a pair, and several pairs, in one generate call),
+and on CPU the model can be int8 dynamically quantized (NL2FUNC_SUMMARIZER_INT8=1).
+"""
+import os
+import threading
+import time
+
+import torch
+from transformers import T5Tokenizer, T5ForConditionalGeneration
+
+MODEL_DIR = "./t5-small"
+SUMMARIZER_MODE = os.environ.get("NL2FUNC_SUMMARIZER_MODE", "quality")
+SUMMARIZER_INT8 = os.environ.get("NL2FUNC_SUMMARIZER_INT8", "0") == "1"
+PROMPT = "lightly summarize the following text: "
+
+MODES = {
+    "quality": dict(max_input=2048, num_beams=4, max_length=1024, min_length=30, length_penalty=1.0, early_stopping=True),
+    "fast": dict(max_input=512, num_beams=2, max_length=128, min_length=10, early_stopping=True),
+    "greedy": dict(max_input=512, num_beams=1, max_length=128, min_length=10),
+}
+
+
+def load_t5(model_dir=MODEL_DIR):
+    # Save locally for conversion
+    try:
+        tokenizer = T5Tokenizer.from_pretrained(model_dir)
+        model = T5ForConditionalGeneration.from_pretrained(model_dir)
+    except:
+        tokenizer = T5Tokenizer.from_pretrained("t5-small")
+        model = T5ForConditionalGeneration.from_pretrained("t5-small")
+        model.save_pretrained(model_dir)
+        tokenizer.save_pretrained(model_dir)
+    return tokenizer, model
+
+
+class SummarizerService:
+    """Lazily loaded T5 summarizer for one mode; safe to share between threads."""
+
+    def __init__(self, mode=SUMMARIZER_MODE, quantize=SUMMARIZER_INT8, model_dir=MODEL_DIR):
+        if mode not in MODES:
+            raise ValueError(f"Unknown summarizer mode: {mode} (expected one of {', '.join(MODES)})")
+        self.mode = mode
+        self.quantize = quantize
+        self.model_dir = model_dir
+        self.tokenizer = None
+        self.model = None
+        self._load_lock = threading.Lock()
+        self._generate_lock = threading.Lock()
+
+    def load(self):
+        with self._load_lock:
+            if self.model is None:
+                t0 = time.perf_counter()
+                tokenizer, model = load_t5(self.model_dir)
+                model.eval()
+                if self.quantize:
+                    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+                self.tokenizer, self.model = tokenizer, model
+                print(f"[DEBUG][Summarizer] Loaded T5 ({self.mode}{', int8' if self.quantize else ''}) "
+                      f"in {time.perf_counter() - t0:.1f} s")
+        return self.tokenizer, self.model
+
+    def summarize_batch(self, texts):
+        """Summaries for a list of texts from a single generate call, in order."""
+        if not texts:
+            return []
+        tokenizer, model = self.load()
+        settings = dict(MODES[self.mode])
+        max_input = settings.pop("max_input")
+        inputs = tokenizer([PROMPT + t for t in texts], return_tensors="pt", padding=True,
+                           max_length=max_input, truncation=True)
+        with self._generate_lock, torch.inference_mode():
+            outputs = model.generate(**inputs, **settings)
+        return tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+    def summarize(self, text):
+        return self.summarize_batch([text])[0]
+
+    def summarize_pairs(self, pairs):
+        """[(user, assistant), ...] -> [(user summary, assistant summary), ...] in one batch."""
+        texts = []
+        for user_msg, assistant_msg in pairs:
+            texts += [f"User: {user_msg}", f"Assistant: {assistant_msg}"]
+        summaries = self.summarize_batch(texts)
+        return list(zip(summaries[0::2], summaries[1::2]))
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_summarizer(mode=None, quantize=None):
+    mode = mode or SUMMARIZER_MODE
+    quantize = SUMMARIZER_INT8 if quantize is None else quantize
+    with _services_lock:
+        if (mode, quantize) not in _services:
+            _services[(mode, quantize)] = SummarizerService(mode, quantize)
+        return _services[(mode, quantize)]